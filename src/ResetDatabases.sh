@@ -2,6 +2,8 @@
 # Use this shell script to reset databases for each microservice
 
 git checkout catalog/catalog_database.json
+rm -f catalog/catalog_log.jsonl catalog/catalog_log.jsonl.old
 git checkout orders/order1_database.json
 git checkout orders/order2_database.json
-git checkout orders/order3_database.json
\ No newline at end of file
+git checkout orders/order3_database.json
+rm -f orders/order*_segment_*.jsonl
\ No newline at end of file
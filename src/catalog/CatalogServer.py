@@ -1,8 +1,10 @@
-from flask import Flask
+from flask import Flask, Response
 from flask import request as FlaskRequest
-import requests
 import json
-from threading import Lock
+from threading import Lock, Thread, Condition
+import time
+from WriteAheadLog import WriteAheadLog
+from InvalidationStream import InvalidationStream
 
 from dotenv import load_dotenv
 import os
@@ -12,44 +14,157 @@ import sys
 load_dotenv()
 
 # Option for caching
-# 0 = cache not in use (do not send invalidation requests)
-# 1 = cache in use (send invalidation requests)
+# 0 = cache not in use (do not publish invalidations)
+# 1 = cache in use (publish invalidations)
 USE_CACHE = int(sys.argv[1])
 
 # Initialize catalog host and port from environment variables
 CATALOG_HOST = '0.0.0.0'
 CATALOG_PORT = int(os.getenv('CATALOG_PORT'))
 
-# Initialize front end host and port from environment variables
-FRONT_HOST = os.getenv('FRONT_HOST')
-FRONT_PORT = int(os.getenv('FRONT_PORT'))
-URL_FRONT_INVALIDATE = f"http://{FRONT_HOST}:{FRONT_PORT}/invalidate"
+# Server used to run the app: 'development' for Flask's built-in server, or 'production' for Waitress
+SERVER_MODE = os.getenv('SERVER_MODE', 'development')
 
-# Initialize database lock
-DB_LOCK = Lock()
+# Number of threads handling requests, and maximum number of open connections, in production mode
+SERVER_THREADS = int(os.getenv('SERVER_THREADS', '16'))
+SERVER_CONNECTION_LIMIT = int(os.getenv('SERVER_CONNECTION_LIMIT', '1000'))
+
+# Seconds to wait after an update before publishing invalidations, so updates to the same stock are coalesced
+INVALIDATION_WINDOW = float(os.getenv('CATALOG_INVALIDATION_WINDOW', '0.005'))
+
+# Number of published batches of invalidations kept for front ends that reconnect to the invalidation stream
+STREAM_BUFFER_SIZE = int(os.getenv('CATALOG_STREAM_BUFFER_SIZE', '1024'))
+
+# Seconds between keep-alive messages on an idle invalidation stream, so a closed connection is noticed
+STREAM_HEARTBEAT = float(os.getenv('CATALOG_STREAM_HEARTBEAT', '5'))
+
+# Maximum number of front ends subscribed to the invalidation stream at once
+# Each subscriber holds a request thread for as long as it is connected, so this must stay well below SERVER_THREADS
+STREAM_MAX_SUBSCRIBERS = int(os.getenv('CATALOG_STREAM_MAX_SUBSCRIBERS', '4'))
+
+# On-disk snapshot of the catalog and the log of updates made since the snapshot
+DB_FILENAME = 'catalog_database.json'
+LOG_FILENAME = 'catalog_log.jsonl'
+
+# Number of logged updates after which a new snapshot is written and the log is truncated
+SNAPSHOT_THRESHOLD = int(os.getenv('CATALOG_SNAPSHOT_THRESHOLD', '1000'))
+
+# Seconds between checks of whether the log needs compacting
+COMPACTION_CHECK_INTERVAL = float(os.getenv('CATALOG_COMPACTION_CHECK_INTERVAL', '1'))
 
 """ FLASK APP """
-# Initialize in-memory database
-memoryDB = {}
-with open('catalog_database.json', 'r') as infile:
-    memoryDB = json.load(infile)
+# Initialize in-memory database by loading the snapshot and replaying the log
+wal = WriteAheadLog(DB_FILENAME, LOG_FILENAME)
+memoryDB = wal.replay()
+
+# Start from a fresh snapshot so the recovered log does not have to be replayed again
+wal.rotate()
+wal.write_snapshot(memoryDB)
+
+# Initialize one lock per stock, so trades on different stocks do not wait for each other
+# Locks are only held by writers: stock records are never modified in place, so lookups can read memoryDB without them
+STOCK_LOCKS = {}
+for stockName in memoryDB:
+    STOCK_LOCKS[stockName] = Lock()
+
+# Write out a new snapshot of the database and truncate the log
+def compact_database():
+    # Rotate the log first: every entry in the rotated log was applied to memoryDB before it was logged,
+    # so the snapshot taken below is guaranteed to cover it
+    wal.rotate()
+
+    # Records are replaced rather than modified, so a shallow copy is a consistent snapshot of each stock
+    snapshot = dict(memoryDB)
+
+    # The snapshot is written without holding any stock lock, so updates are not blocked on disk I/O
+    wal.write_snapshot(snapshot)
+
+# Background thread that compacts the log once it grows large enough
+def run_log_compactor():
+    while True:
+        time.sleep(COMPACTION_CHECK_INTERVAL)
+
+        try:
+            if wal.needs_compaction(SNAPSHOT_THRESHOLD):
+                compact_database()
+        except Exception as e:
+            # Keep checking after a failure, so the log is still compacted later
+            print(f"Failed to compact the log: {e}")
+
+Thread(target=run_log_compactor, daemon=True).start()
+
+# Names of stocks waiting to be invalidated at the front ends
+pendingInvalidations = set()
+INVALIDATION_CONDITION = Condition()
+
+# Stream of invalidations that front ends subscribe to
+invalidationStream = InvalidationStream(STREAM_BUFFER_SIZE, STREAM_MAX_SUBSCRIBERS)
+
+# Queue a stock to be invalidated at the front ends by the invalidation publisher
+def queue_invalidation(stockName):
+    INVALIDATION_CONDITION.acquire()
+    pendingInvalidations.add(stockName)
+    INVALIDATION_CONDITION.notify()
+    INVALIDATION_CONDITION.release()
+
+# Background thread that publishes queued invalidations to the invalidation stream in batches
+def run_invalidation_publisher():
+    global pendingInvalidations
+    while True:
+        # Wait until at least one stock needs to be invalidated
+        INVALIDATION_CONDITION.acquire()
+        while not pendingInvalidations:
+            INVALIDATION_CONDITION.wait()
+        INVALIDATION_CONDITION.release()
+
+        # Let further updates arrive during the window, so each stock is only sent once
+        time.sleep(INVALIDATION_WINDOW)
+
+        # Take every queued stock
+        INVALIDATION_CONDITION.acquire()
+        stockNames = list(pendingInvalidations)
+        pendingInvalidations = set()
+        INVALIDATION_CONDITION.release()
+
+        invalidationStream.publish(stockNames)
+
+# Only publish invalidations if caching is being used
+if USE_CACHE:
+    Thread(target=run_invalidation_publisher, daemon=True).start()
 
 # Initialize flask app
 app = Flask(__name__)
 
+# Apply a change in quantity to a stock (the stock's lock must be held by caller)
+def publish_quantity(stockName, delta):
+    # Copy the current record and publish the updated copy with a single assignment,
+    # so concurrent lookups see either the old or the new record and never a partial update
+    # Every update gives the stock a new version, so clients can tell whether a copy of it is current
+    newRecord = dict(memoryDB[stockName])
+    newRecord["quantity"] += delta
+    newRecord["version"] += 1
+    memoryDB[stockName] = newRecord
+
+    # Append the update to the on-disk log
+    wal.append(stockName, delta, newRecord["quantity"], newRecord["version"])
+
 """ Routes """
 # GET /lookup/<stock_name> route
 # Reply with information about the stock, or reply with an error if it is not in the database
+# The stock's version is sent as its ETag, and if the request's If-None-Match header holds the current version,
+# the reply is an empty 304 so the client can keep using its copy
 @app.get('/lookup/<stockName>')
 def lookup(stockName):
-    """ Begin Critical Region """
-    DB_LOCK.acquire()
-
-    resJSON = {}
+    # Read the currently published record for the stock
+    # No lock is needed: writers publish a new record instead of modifying this one
+    resJSON = memoryDB.get(stockName)
     successFlag = False
-    if stockName in memoryDB:
-        resJSON = memoryDB[stockName]
+    if resJSON is not None:
         successFlag = True
+        etag = str(resJSON["version"])
+        if FlaskRequest.if_none_match.contains(etag):
+            # The client already has the current version of the stock
+            return "", 304, {"ETag": f'"{etag}"'}
     else:
         resJSON = {
             "error": {
@@ -57,27 +172,88 @@ def lookup(stockName):
                 "message": "stock not found"
             }
         }
-    
-    DB_LOCK.release()
-    """ End Critical Region """
 
     # Return the appropriate message, depending on if stock was in catalog
     if successFlag:
         # If the stock was in the catalog, return stock info
-        return resJSON
+        return resJSON, 200, {"ETag": f'"{etag}"'}
     else:
         # If the stock was not in the catalog, return a 404 error message
         return resJSON, 404
-    
+
+# GET /lookup-batch?names=<name>,<name>,... route
+# Look up many stocks in one request, so the front end can fetch every stock missing from its cache in one round trip
+# Replies with a list holding the information about each stock, or an error for each stock not in the database
+@app.get('/lookup-batch')
+def lookup_batch():
+    # Parse the comma-separated list of stock names
+    stockNames = [name for name in FlaskRequest.args.get('names', '').split(',') if name]
+
+    results = []
+    for stockName in stockNames:
+        # Read each record without a lock, as in /lookup
+        record = memoryDB.get(stockName)
+        if record is None:
+            record = {
+                "error": {
+                    "code": 404,
+                    "message": "stock not found"
+                }
+            }
+        results.append(record)
+
+    return {"results": results}
+
+
+# Attempt to apply a trade to a stock
+# Returns 200 if the trade was applied, 404 if the stock is not in the catalog,
+# 409 if there are not enough shares to buy, or 400 if the transaction type is invalid
+def apply_trade(stockName, quantity, transactionType):
+    # Check that the stock is in the catalog
+    # The set of stocks never changes, so this does not need a lock
+    if stockName not in memoryDB:
+        return 404
+
+    """ Begin Critical Region """
+    # Lock the stock being traded
+    STOCK_LOCKS[stockName].acquire()
+
+    code = 200
+    if transactionType == 'sell':
+        # If stock is being sold, increment the number of shares
+        publish_quantity(stockName, quantity)
+    elif transactionType == 'buy':
+        # If the stock is being bought, check that there are enough shares and decrement them
+        # Both happen in the same critical region, so concurrent buys can never oversell a stock
+        if memoryDB[stockName]["quantity"] >= quantity:
+            publish_quantity(stockName, -quantity)
+        else:
+            code = 409
+    else:
+        # Invalid transaction type
+        code = 400
+
+    # Release lock on the stock
+    STOCK_LOCKS[stockName].release()
+    """ End Critical Region """
+
+    if code == 200:
+        # Check if caching is being used
+        if USE_CACHE:
+            # Notify front end services that the current stock should be removed
+            queue_invalidation(stockName)
+
+    return code
+
+# Force logged updates to disk before replying, so an acknowledged update survives a crash
+# Requests that arrive during an fsync wait for it and are covered by the next one, so concurrent updates share fsyncs
+def sync_log():
+    wal.sync()
 
 # POST /update route
 # Attempt to update the given stock, or reply with an error if the stock can not be updated
 @app.post('/update')
 def update():
-    """ Begin Critical Region """
-    # Lock the database
-    DB_LOCK.acquire()
-
     # Parse the JSON from the request
     requestJSON = FlaskRequest.get_json()
     stockName = requestJSON["name"]
@@ -100,56 +276,157 @@ def update():
         }
     }
 
-    successFlag = False # Set this flag if the update is a success
-
-    if stockName in memoryDB: # Case where a valid stock is being updated
-        if transactionType == 'sell':
-            # If stock is being sold, increment the number of shares and mark success flag as True
-            memoryDB[stockName]["quantity"] += quantity
-
-            # Update on-disk database
-            with open('catalog_database.json', 'w') as outfile:
-                outfile.write(json.dumps(memoryDB, indent=4))
-            successFlag = True
-        elif transactionType == 'buy':
-            # If the stock is being bought, decrement the number of shares and mark success flag as True
-            memoryDB[stockName]["quantity"] -= quantity
-
-            # Update on-disk database
-            with open('catalog_database.json', 'w') as outfile:
-                outfile.write(json.dumps(memoryDB, indent=4))
-            successFlag = True
-        else: 
-            # Invalid transaction, mark success flag as False
-            successFlag = False
-    else:
-        # Stock was not in the database, so mark success flag as False
-        successFlag = False
-    
-    # Release lock on database
-    DB_LOCK.release()
-    """ End Critical Region """
-
     # Send success or error, depending on if the update succeeded
-    if successFlag: # Case where update succeeded
-        # Check if caching is being used
-        if USE_CACHE:
-            # Notify front end service that the current stock should be removed
-            url = f"{URL_FRONT_INVALIDATE}/{stockName}"
-            
-            try:
-                # For testing: Do not need to start front end service if only testing catalog service
-                res = requests.post(url)
-            except:
-                pass
-
-        # Return success message
+    if apply_trade(stockName, quantity, transactionType) == 200: # Case where update succeeded
+        # Return success message once the update is on disk
+        sync_log()
         return successMsg
     else:
         # Update failed, so return error
         return errorMsg
+
+# Error messages for each way a trade can fail
+TRADE_ERROR_MESSAGES = {
+    400: "invalid transaction type",
+    404: "stock not found",
+    409: "not enough shares to buy"
+}
+
+# POST /trade route
+# Check that a trade can be made and apply it in one step, so the order service makes one round trip per trade
+@app.post('/trade')
+def trade():
+    # Parse the JSON from the request
+    requestJSON = FlaskRequest.get_json()
+    stockName = requestJSON["name"]
+    quantity = requestJSON["quantity"]
+    transactionType = requestJSON["type"]
+
+    # Apply the trade, and reply with the reason if it could not be made
+    code = apply_trade(stockName, quantity, transactionType)
+    if code == 200:
+        sync_log()
+
+    tradeResult = format_trade_result(code)
+    return tradeResult, code
+
+# Format the reply to a trade with the given result code
+def format_trade_result(code):
+    if code == 200:
+        return {
+            "success": {
+                "code": 200,
+                "message": "traded stock successfully"
+            }
+        }
+    else:
+        return {
+            "error": {
+                "code": code,
+                "message": TRADE_ERROR_MESSAGES[code]
+            }
+        }
+
+# POST /trade-batch route
+# Apply a list of trades in order, each one checked and applied atomically as in /trade
+# Replies with a list holding the result of each trade, so the order service can commit many trades per round trip
+@app.post('/trade-batch')
+def trade_batch():
+    # Parse the list of trades from the request
+    requestJSON = FlaskRequest.get_json()
+    trades = requestJSON["trades"]
+
+    # Apply each trade and record its result
+    results = []
+    for curTrade in trades:
+        code = apply_trade(curTrade["name"], curTrade["quantity"], curTrade["type"])
+        results.append(format_trade_result(code))
+
+    # Force every update in the batch to disk at once
+    sync_log()
+
+    return {"results": results}
     
+# Format a server-sent event with the given ID, type and JSON data
+def format_event(eventID, eventType, data):
+    return f"id: {eventID}\nevent: {eventType}\ndata: {json.dumps(data)}\n\n"
+
+# GET /invalidations route
+# Stream invalidations to a front end as server-sent events, for as long as it stays connected
+# Each batch of stock names is sent as an "invalidate" event, with an ID holding its sequence number
+# A front end that reconnects sends the last ID it received in the Last-Event-ID header, and is sent every batch it missed
+# If those batches are no longer buffered, or the front end is new, it is sent a "reset" event and should clear its cache
+# Once STREAM_MAX_SUBSCRIBERS front ends are subscribed, more are turned away with a 503, so lookups and trades always have threads left
+# Front ends that are turned away poll with GET /invalidations?after=<id> instead, which replies at once without holding a thread
+@app.get('/invalidations')
+def stream_invalidations():
+    if 'after' in FlaskRequest.args:
+        return poll_invalidations(FlaskRequest.args['after'])
+
+    if not invalidationStream.subscribe():
+        return {
+            "error": {
+                "code": 503,
+                "message": "too many subscribers"
+            }
+        }, 503
+
+    lastEventID = FlaskRequest.headers.get('Last-Event-ID')
+
+    def generate():
+        # Resume after the last batch the front end received, if possible
+        afterSeq = invalidationStream.parse_id(lastEventID)
+        if afterSeq is None:
+            afterSeq = invalidationStream.get_last_seq()
+            yield format_event(invalidationStream.format_id(afterSeq), "reset", {})
+
+        while True:
+            events = invalidationStream.read(afterSeq, STREAM_HEARTBEAT)
+            if events is None:
+                # The front end fell too far behind, so have it start over from the latest batch
+                afterSeq = invalidationStream.get_last_seq()
+                yield format_event(invalidationStream.format_id(afterSeq), "reset", {})
+            elif not events:
+                # Nothing was published in time, so send a comment to keep the connection alive
+                yield ": keep-alive\n\n"
+            else:
+                for seq, stockNames in events:
+                    yield format_event(invalidationStream.format_id(seq), "invalidate", {"names": stockNames})
+                    afterSeq = seq
+
+    res = Response(generate(), mimetype='text/event-stream', headers={"Cache-Control": "no-cache"})
+
+    # The server closes the response once the front end disconnects, even if the stream was never started
+    res.call_on_close(invalidationStream.unsubscribe)
+    return res
+
+# Reply to a poll of the invalidation stream with the events published after the event with ID after, without waiting for more
+# As on the stream, a "reset" event is sent instead if the ID is empty or those batches are no longer buffered
+def poll_invalidations(after):
+    afterSeq = invalidationStream.parse_id(after)
+    events = None
+    if afterSeq is not None:
+        events = invalidationStream.read(afterSeq, 0)
+
+    if events is None:
+        body = format_event(invalidationStream.format_id(invalidationStream.get_last_seq()), "reset", {})
+    else:
+        body = ''
+        for seq, stockNames in events:
+            body += format_event(invalidationStream.format_id(seq), "invalidate", {"names": stockNames})
+    return Response(body, mimetype='text/event-stream', headers={"Cache-Control": "no-cache"})
+
 """ END FLASK APP """    
 
+# Run the app on the given host and port with the server chosen by SERVER_MODE
+def serve_app(host, port):
+    if SERVER_MODE == 'production':
+        # Waitress handles requests on a pool of threads inside this one process,
+        # so every request still shares the same in-memory database
+        from waitress import serve
+        serve(app, host=host, port=port, threads=SERVER_THREADS, connection_limit=SERVER_CONNECTION_LIMIT)
+    else:
+        app.run(host=host, port=port)
+
 if __name__ == "__main__":
-    app.run(host=CATALOG_HOST, port=CATALOG_PORT)
\ No newline at end of file
+    serve_app(CATALOG_HOST, CATALOG_PORT)
\ No newline at end of file
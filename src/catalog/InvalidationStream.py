@@ -0,0 +1,92 @@
+from threading import Condition
+from collections import deque
+import time
+
+class InvalidationStream():
+    def __init__(self, bufferSize, maxSubscribers):
+        # Identifies this run of the catalog, so subscribers can tell that sequence numbers started over after a restart
+        self.epoch = str(int(time.time() * 1000))
+
+        # Ring buffer of the most recent batches of invalidations, as (sequence number, stock names) pairs
+        # Subscribers that reconnect are sent the batches they missed from here
+        self.events = deque(maxlen=bufferSize)
+
+        # Sequence number of the last batch published
+        self.lastSeq = 0
+
+        # Number of subscribers currently connected, and the most that may be connected at once
+        # Each subscriber holds one of the server's request threads for as long as it stays connected
+        self.numSubscribers = 0
+        self.maxSubscribers = maxSubscribers
+
+        # Condition used to wake up subscribers when a batch is published
+        self.condition = Condition()
+
+    """
+    Method that publishes a batch of stock names to every subscriber
+    """
+    def publish(self, stockNames):
+        self.condition.acquire()
+        self.lastSeq += 1
+        self.events.append((self.lastSeq, stockNames))
+        self.condition.notify_all()
+        self.condition.release()
+
+    """
+    Method that claims a place for a new subscriber
+    Returns False if maxSubscribers subscribers are already connected
+    """
+    def subscribe(self):
+        self.condition.acquire()
+        subscribed = self.numSubscribers < self.maxSubscribers
+        if subscribed:
+            self.numSubscribers += 1
+        self.condition.release()
+        return subscribed
+
+    # Release the place claimed by a subscriber that has disconnected
+    def unsubscribe(self):
+        self.condition.acquire()
+        self.numSubscribers -= 1
+        self.condition.release()
+
+    def get_last_seq(self):
+        return self.lastSeq
+
+    def format_id(self, seq):
+        # Event IDs carry the epoch, so an ID from a previous run of the catalog is never mistaken for a current one
+        return f"{self.epoch}-{seq}"
+
+    """
+    Method that parses an event ID sent back by a reconnecting subscriber
+    Returns its sequence number, or None if the ID is missing or from a previous run of the catalog
+    """
+    def parse_id(self, eventID):
+        if not eventID:
+            return None
+
+        epoch, _, seq = eventID.partition('-')
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self.lastSeq:
+            return None
+        return int(seq)
+
+    """
+    Method that waits up to timeout seconds for batches published after sequence number afterSeq
+    Returns a list of (sequence number, stock names) pairs, which is empty if nothing was published in time,
+    or None if some of the batches after afterSeq have already been dropped from the buffer
+    """
+    def read(self, afterSeq, timeout):
+        self.condition.acquire()
+        if self.lastSeq == afterSeq:
+            self.condition.wait(timeout)
+
+        events = None
+        oldestSeq = self.lastSeq + 1
+        if self.events:
+            oldestSeq = self.events[0][0]
+
+        # Check that every batch after afterSeq is still in the buffer
+        if oldestSeq <= afterSeq + 1:
+            events = [event for event in self.events if event[0] > afterSeq]
+        self.condition.release()
+        return events
@@ -0,0 +1,182 @@
+from threading import Lock
+import json
+import os
+import shutil
+
+class WriteAheadLog():
+    def __init__(self, snapshotFile, logFile):
+        # On-disk snapshot of the whole catalog and the append-only log of updates made since
+        self.snapshotFile = snapshotFile
+        self.logFile = logFile
+
+        # Log that was rotated out by an in-progress compaction
+        self.oldLogFile = f"{logFile}.old"
+
+        # Number of entries appended to the current log since the last compaction
+        self.numEntries = 0
+
+        # Number of entries written to the log, and how many of them are known to be fsync'd
+        # Counted across rotations, so a sync only has to fsync if entries were written since the last one
+        self.writtenCount = 0
+        self.syncedCount = 0
+
+        # Open the log for appending
+        self.outfile = open(self.logFile, 'a')
+
+        # Lock held while writing an entry, and lock held while fsyncing the log
+        # The fsync is done without holding the write lock, so updates to other stocks are not held up by it
+        # When both are needed, the sync lock is taken first
+        self.lock = Lock()
+        self.syncLock = Lock()
+
+    """
+    Method that loads the snapshot and replays the log on top of it
+    Returns the recovered database as a dictionary
+
+    Each log entry records the quantity and version of the stock after the update, so replaying
+    an entry that is already reflected in the snapshot leaves the database unchanged
+    """
+    def replay(self):
+        memoryDB = {}
+        with open(self.snapshotFile, 'r') as infile:
+            memoryDB = json.load(infile)
+
+        # Snapshots written before stocks were versioned start every stock at version 0
+        for stockName in memoryDB:
+            memoryDB[stockName].setdefault("version", 0)
+
+        # Replay a log left behind by an interrupted compaction first, then the current log
+        for fileName in [self.oldLogFile, self.logFile]:
+            if not os.path.exists(fileName):
+                continue
+
+            with open(fileName, 'r') as infile:
+                for line in infile:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A partially written entry can only be at the end of the log, so stop here
+                        break
+
+                    stockName = entry["name"]
+                    if stockName in memoryDB:
+                        record = memoryDB[stockName]
+                        record["quantity"] = entry["quantity"]
+                        # Entries logged before stocks were versioned count as one update each
+                        record["version"] = entry.get("version", record["version"] + 1)
+
+        return memoryDB
+
+    """
+    Method that appends an update to the log
+    The entry is handed to the operating system immediately and fsync'd by the next call to sync()
+    """
+    def append(self, stockName, delta, quantity, version):
+        # Format log entry
+        entry = {
+            "name": stockName,
+            "delta": delta,
+            "quantity": quantity,
+            "version": version
+        }
+
+        self.lock.acquire()
+        self.outfile.write(json.dumps(entry) + '\n')
+        self.outfile.flush()
+        self.numEntries += 1
+        self.writtenCount += 1
+        self.lock.release()
+
+    """
+    Method that forces every entry appended before this call to disk
+    Concurrent calls share fsyncs: a call that waited for another one's fsync returns without its own if it was covered
+    """
+    def sync(self):
+        self.lock.acquire()
+        targetCount = self.writtenCount
+        self.lock.release()
+
+        self.syncLock.acquire()
+        try:
+            if self.syncedCount < targetCount:
+                # Cover every entry written so far, including those appended while waiting for the sync lock
+                self.lock.acquire()
+                syncCount = self.writtenCount
+                fileno = self.outfile.fileno()
+                self.lock.release()
+
+                os.fsync(fileno)
+                self.syncedCount = syncCount
+        finally:
+            self.syncLock.release()
+
+    """
+    Method that moves the current log aside and starts a new, empty one
+    If a log moved aside earlier is still there, the current log is added to the end of it, so no entry is ever overwritten
+    Entries appended after this call belong to the new log
+    """
+    def rotate(self):
+        # Hold the sync lock throughout, so the log is not closed while another thread is fsyncing it
+        self.syncLock.acquire()
+        try:
+            # Force the log to disk before blocking writers, so they only wait for the entries appended meanwhile
+            os.fsync(self.outfile.fileno())
+
+            self.lock.acquire()
+            try:
+                # Make sure everything in the current log is on disk before moving it
+                self.outfile.flush()
+                os.fsync(self.outfile.fileno())
+                self.outfile.close()
+
+                if os.path.exists(self.oldLogFile):
+                    # An earlier compaction never wrote its snapshot, so the old log holds entries no snapshot covers
+                    # Add the current log to the end of it instead of replacing it
+                    self.append_to_old_log()
+                    os.remove(self.logFile)
+                else:
+                    os.replace(self.logFile, self.oldLogFile)
+                self.outfile = open(self.logFile, 'a')
+                self.numEntries = 0
+                self.syncedCount = self.writtenCount
+            finally:
+                self.lock.release()
+        finally:
+            self.syncLock.release()
+
+    """
+    Method that copies the current log onto the end of the old log and forces it to disk
+    If a crash stops this before the current log is removed, its entries are replayed twice, which leaves the database unchanged
+    """
+    def append_to_old_log(self):
+        with open(self.oldLogFile, 'r+b') as outfile:
+            # Drop an entry torn by a crash at the end of the old log, so it does not run into the first copied entry
+            contents = outfile.read()
+            outfile.seek(contents.rfind(b'\n') + 1)
+            outfile.truncate()
+
+            with open(self.logFile, 'rb') as infile:
+                shutil.copyfileobj(infile, outfile)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+
+    """
+    Method that writes out a new snapshot and discards the log that was rotated out
+    The snapshot must be taken after calling rotate(), so it covers every entry in the old log
+    """
+    def write_snapshot(self, memoryDB):
+        # Write the snapshot to a temporary file and move it into place, so a crash never leaves a partial snapshot
+        tempFile = f"{self.snapshotFile}.tmp"
+        with open(tempFile, 'w') as outfile:
+            outfile.write(json.dumps(memoryDB, indent=4))
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(tempFile, self.snapshotFile)
+
+        # The old log is now covered by the snapshot
+        if os.path.exists(self.oldLogFile):
+            os.remove(self.oldLogFile)
+
+    def needs_compaction(self, threshold):
+        # Check if enough entries have been appended to the log to make a new snapshot worthwhile
+        return self.numEntries >= threshold
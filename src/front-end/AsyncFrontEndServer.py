@@ -0,0 +1,678 @@
+from aiohttp import web
+import aiohttp
+import asyncio
+from functools import partial
+from Cache import LruCache
+from SingleFlight import AsyncSingleFlight
+from FrontEndCommon import (
+    ORDER_SERVERS, FRONT_PORT, ORDER_READ_ROUTING,
+    ORDER_HEARTBEAT_INTERVAL, ORDER_HEARTBEAT_MISSES,
+    URL_CATALOG, URL_CATALOG_INVALIDATIONS, INVALIDATION_STREAM_TIMEOUT, INVALIDATION_RETRY_DELAY, INVALIDATION_POLL_INTERVAL,
+    HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT,
+    CACHE_SIZE, CACHE_TTL, CACHE_STALE_TTL, ORDER_CACHE_SIZE,
+    ReplicaTracker, EventStreamParser,
+    get_revalidation, cache_order, invalidate_stock, handle_stream_event
+)
+import FrontEndCommon
+
+# For reading the cache flag
+import sys
+
+# Option for caching
+# 0 = do not cache lookups
+# 1 = cache lookups
+USE_CACHE = int(sys.argv[1])
+
+# Timeout for a heartbeat sent to an order replica
+ORDER_HEARTBEAT_TIMEOUT = aiohttp.ClientTimeout(total=FrontEndCommon.ORDER_HEARTBEAT_TIMEOUT)
+
+# Timeouts for connecting to another service, and for it to reply
+HTTP_TIMEOUT = aiohttp.ClientTimeout(sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)
+
+# Sessions are created once the event loop is running (see create_sessions)
+CATALOG_SESSION = None
+ORDER_SESSIONS = {}
+
+# Create a session that keeps connections to a service alive, so they can be reused across requests
+# Requests waiting for one of the pooled connections are suspended, not blocked, so they do not hold up the event loop
+def create_session():
+    connector = aiohttp.TCPConnector(limit=HTTP_POOL_SIZE)
+    return aiohttp.ClientSession(connector=connector, timeout=HTTP_TIMEOUT)
+
+""" AIOHTTP APP """
+# Initialize in-memory cache with the number of stocks it can hold
+# Handlers all run on the event loop thread, so the cache's lock is never contended
+cache = LruCache(CACHE_SIZE, CACHE_TTL, CACHE_STALE_TTL)
+
+# Initialize in-memory cache of order records with the number of orders it can hold
+orderCache = LruCache(ORDER_CACHE_SIZE)
+
+# Catalog lookups in flight, so concurrent cache misses for the same stock share one lookup
+lookups = AsyncSingleFlight()
+
+# Table of routes served by the app
+routes = web.RouteTableDef()
+
+# Lock held while choosing a leader, so requests that fail at the same time only start one election
+LEADER_LOCK = asyncio.Lock()
+
+# Function to broadcast to the order replicas that the front end has chosen a leader
+async def send_leader_broadcast(leaderID):
+    # Send the broadcast to every other replica at once
+    tasks = []
+    for serverID in ORDER_SERVERS:
+        if serverID != leaderID:
+            tasks.append(send_leader_message(serverID, leaderID))
+    await asyncio.gather(*tasks)
+
+# Tell the replica with id serverID that the replica with id leaderID is the leader
+async def send_leader_message(serverID, leaderID):
+    host, port = ORDER_SERVERS[serverID]
+    url = f"http://{host}:{port}/leader-broadcast"
+    attachedJSON = {"leader-id": leaderID}
+    try:
+        # Send message to the corresponding replica, with the heartbeat timeout so a dead replica does not hold up the election
+        async with ORDER_SESSIONS[serverID].post(url, json=attachedJSON, timeout=ORDER_HEARTBEAT_TIMEOUT) as res:
+            await res.read()
+    except:
+        # If the replica was unresponsive, simply move on
+        pass
+
+# Record that the replica with id leaderID is the leader, and broadcast it to the other replicas
+async def set_leader(leaderID):
+    if replicas.set_leader(leaderID):
+        # The new leader may be missing orders the old leader committed, and give their numbers to new orders,
+        # so the cached order records can no longer be trusted
+        orderCache.clear()
+
+    # Broadcast that a leader has been chosen
+    await send_leader_broadcast(leaderID)
+    print(f"Found leader! Order Service {leaderID} at {ORDER_SERVERS[leaderID]}")
+
+"""
+Coroutine that selects a leader among the order replicas
+Every replica is sent a heartbeat at once, so replicas that are down only delay the election by a single timeout
+The live replica with the highest ID is then pinged to make it the leader
+Returns True if a leader was found
+"""
+async def ping_order_servers():
+    await probe_replicas()
+
+    # Try the live replicas from highest to lowest ID
+    for candidateID in replicas.get_leader_candidates():
+        if await elect_leader(candidateID):
+            return True
+
+    # If no replica answered, return False: could not connect to order service
+    return False
+
+# Leader, and which replicas answered their heartbeats, as last seen by the front end
+replicas = ReplicaTracker(ORDER_SERVERS, ORDER_HEARTBEAT_MISSES)
+
+# Send a heartbeat to the replica with id serverID, and record whether it answered in time
+async def probe_replica(serverID):
+    host, port = ORDER_SERVERS[serverID]
+    url = f"http://{host}:{port}/status"
+    try:
+        async with ORDER_SESSIONS[serverID].get(url, timeout=ORDER_HEARTBEAT_TIMEOUT) as res:
+            replicas.record_heartbeat(serverID, await res.json())
+    except:
+        replicas.record_missed_heartbeat(serverID)
+
+# Send a heartbeat to every replica at once, and wait for them all to answer or time out
+async def probe_replicas():
+    tasks = []
+    for serverID in ORDER_SERVERS:
+        tasks.append(probe_replica(serverID))
+    await asyncio.gather(*tasks)
+
+# Background task that sends heartbeats to every replica, so the front end always knows which replicas are alive
+# If the leader misses ORDER_HEARTBEAT_MISSES heartbeats in a row, a new leader is chosen before a trade has to fail
+async def run_heartbeat():
+    while True:
+        await probe_replicas()
+
+        failedLeaderID = replicas.get_failed_leader()
+        if failedLeaderID is not None:
+            await fail_over(failedLeaderID)
+
+        await asyncio.sleep(ORDER_HEARTBEAT_INTERVAL)
+
+# Make the replica with id candidateID the leader, returning False if it did not answer
+async def elect_leader(candidateID):
+    host, port = ORDER_SERVERS[candidateID]
+    url = f"http://{host}:{port}/ping"
+    try:
+        async with ORDER_SESSIONS[candidateID].get(url, timeout=ORDER_HEARTBEAT_TIMEOUT) as res:
+            resJSON = await res.json()
+        if "success" in resJSON:
+            await set_leader(candidateID)
+            return True
+    except:
+        pass
+
+    # The candidate is dead too, so skip it until it answers a heartbeat again
+    replicas.mark_dead(candidateID)
+    return False
+
+"""
+Coroutine that replaces the leader with id failedLeaderID after it stopped responding
+The live replica with the highest ID, as known from the heartbeats, is made the leader with a single ping
+If none of them answer, a new election is run as on startup
+Returns True if a leader was found
+"""
+async def fail_over(failedLeaderID):
+    async with LEADER_LOCK:
+        # Another request may have already replaced the failed leader while this one waited
+        if replicas.leaderID != failedLeaderID:
+            return True
+        replicas.mark_dead(failedLeaderID)
+
+        # Try the live replicas from highest to lowest ID, as ping_order_servers does
+        for candidateID in replicas.get_leader_candidates(excludeID=failedLeaderID):
+            if await elect_leader(candidateID):
+                return True
+        return await ping_order_servers()
+
+# Read the status code and JSON of a response from the order service
+# Error responses are returned without parsing their body, since it may not be JSON
+async def read_order_response(res):
+    if res.status >= 400:
+        return res.status, None
+    return res.status, await res.json()
+
+# Attempt to look up an order on a follower instead of the leader
+# Returns the follower's status code and JSON if it found the order, or None if the lookup should be sent to the leader instead
+async def lookup_order_on_follower(orderNum):
+    try:
+        followerID = replicas.choose_follower(int(orderNum))
+    except ValueError:
+        # The order number is not a number, so let the leader reply
+        return None
+    if followerID is None:
+        return None
+
+    host, port = ORDER_SERVERS[followerID]
+    url = f"http://{host}:{port}/lookup-order/{orderNum}"
+    try:
+        async with ORDER_SESSIONS[followerID].get(url) as res:
+            # A follower may be missing an order it was never pushed, so only trust it if it found the order
+            if res.status == 200:
+                return res.status, await res.json()
+    except:
+        # Stop sending lookups to the follower until it answers a heartbeat again
+        replicas.mark_dead(followerID)
+    return None
+
+"""
+Helper method for sending order requests to the order service
+
+It will attempt to make a connection with the order service leader, and in the event
+it cannot, it will run the fail_over function to determine a new leader
+
+Returns the status code and parsed JSON of the response, or None if no leader could be found
+"""
+async def send_order_request(type: str, body, send_post=True, orderNum=-1):
+    while True:
+        # Attempt to connect with order service and get response
+        leaderID = replicas.leaderID
+        try:
+            # Format the url to send an order request
+            leaderHost, leaderPort = ORDER_SERVERS[leaderID]
+            leaderSession = ORDER_SESSIONS[leaderID]
+
+            # Send GET or POST to the order service, depending on whether /orders was called using GET or POST
+            if send_post:
+                orderUrl = f"http://{leaderHost}:{leaderPort}/{type}"
+                async with leaderSession.post(orderUrl, json=body) as res:
+                    return await read_order_response(res)
+            else:
+                orderUrl = f"http://{leaderHost}:{leaderPort}/lookup-order/{orderNum}"
+                async with leaderSession.get(orderUrl) as res:
+                    return await read_order_response(res)
+        except aiohttp.ConnectionTimeoutError:
+            # The leader could not be reached, so the request was never sent
+            leaderFound = await fail_over(leaderID)
+            if not leaderFound:
+                return None
+        except asyncio.TimeoutError:
+            # The leader received the request but did not reply in time, so it may still commit the trade
+            # Do not resend it to another leader, since the trade would then be made twice
+            return None
+        except:
+            # Case where response was not received due to a failure
+            # Attempt to find a new leader
+            leaderFound = await fail_over(leaderID)
+            if not leaderFound:
+                # In the case where a leader could not be found, return None
+                return None
+
+# Look up a stock in the catalog and return the parsed JSON of the response
+async def lookup_catalog(stockName):
+    url = f"{URL_CATALOG}/lookup/{stockName}"
+
+    # If an expired copy of the stock is still cached, only ask for the stock if it has changed since
+    cachedJSON, headers = get_revalidation(cache, stockName)
+    async with CATALOG_SESSION.get(url, headers=headers) as catalogRes:
+        if catalogRes.status == 304:
+            # The cached copy is still current
+            return cachedJSON
+        return await catalogRes.json()
+
+# Look up many stocks in the catalog with one request, and return the parsed JSON for each stock keyed by name
+async def lookup_catalog_batch(stockNames):
+    url = f"{URL_CATALOG}/lookup-batch"
+    async with CATALOG_SESSION.get(url, params={"names": ",".join(stockNames)}) as catalogRes:
+        resJSON = await catalogRes.json()
+    return dict(zip(stockNames, resJSON["results"]))
+
+# Insert the result of a catalog lookup into the cache
+def cache_stock(bodyJSON):
+    # Only put entries into the cache if the flag is set, and never cache a failed lookup
+    if USE_CACHE and "error" not in bodyJSON:
+        cache.insert(bodyJSON)
+
+# Look up a stock in the catalog and cache the result, in the background
+async def refresh_stock(stockName):
+    try:
+        await lookups.do(stockName, lambda: lookup_catalog(stockName), publish=cache_stock)
+    except:
+        # If the refresh failed, the stale stock expires and is fetched again by the next lookup
+        pass
+
+# Background refresh tasks, kept so they are not garbage collected before they finish
+refreshTasks = set()
+
+# Fetch a stock from the cache, starting a background refresh if it is stale
+# Returns None if the stock is not in the cache
+def fetch_cached_stock(stockName):
+    bodyJSON, needsRefresh = cache.fetch(stockName)
+    if needsRefresh:
+        # Serve the stale stock now, and fetch the current one from the catalog in the background
+        task = asyncio.ensure_future(refresh_stock(stockName))
+        refreshTasks.add(task)
+        task.add_done_callback(refreshTasks.discard)
+    return bodyJSON
+
+""" Routes """
+# GET /stocks/<stockName> route
+# Allows user to look up a stock by name
+@routes.get('/stocks/{stockName}')
+async def fetch_stock(request):
+    stockName = request.match_info["stockName"]
+
+    # Fetch stock from cache
+    bodyJSON = fetch_cached_stock(stockName)
+
+    if not bodyJSON: # Case where stock was not in cache
+        # If the specified stock is not in cache, query catalog
+        # If a lookup of the same stock is already in flight, wait for its result instead of sending another
+        bodyJSON = await lookups.do(stockName, lambda: lookup_catalog(stockName), publish=cache_stock)
+
+    # Format the response to the lookup request and return it
+    if "error" in bodyJSON: # Case where lookup failed
+        return web.json_response(bodyJSON, status=404)
+    else:
+        fetchResponse = {
+            "data": bodyJSON
+        }
+        return web.json_response(fetchResponse)
+
+# GET /stocks?names=<name>,<name>,... route
+# Allows user to look up many stocks with one request
+# Stocks in the cache are served from it, and the rest are fetched from the catalog with a single batched lookup
+@routes.get('/stocks')
+async def fetch_stocks(request):
+    # Parse the comma-separated list of stock names, ignoring repeated names
+    namesArg = request.query.get('names')
+    if not namesArg:
+        return web.json_response({
+            "error": {
+                "code": 400,
+                "message": "no stock names given"
+            }
+        }, status=400)
+    stockNames = list(dict.fromkeys(name for name in namesArg.split(',') if name))
+
+    # Fetch each stock from the cache, and collect the stocks that were not in it
+    results = {}
+    missingNames = []
+    for stockName in stockNames:
+        bodyJSON = fetch_cached_stock(stockName)
+        if bodyJSON:
+            results[stockName] = bodyJSON
+        else:
+            missingNames.append(stockName)
+
+    if missingNames:
+        # Query the catalog for every missing stock at once
+        # Stocks that already have a lookup in flight wait for it instead of being fetched again
+        results.update(await lookups.do_many(missingNames, lookup_catalog_batch, publish=cache_stock))
+
+    # Reply with the stocks that were found, in the order they were asked for, and the names of the rest
+    stocks = []
+    notFound = []
+    for stockName in stockNames:
+        if "error" in results[stockName]:
+            notFound.append(stockName)
+        else:
+            stocks.append(results[stockName])
+
+    return web.json_response({
+        "data": {
+            "stocks": stocks,
+            "not-found": notFound
+        }
+    })
+
+# POST /orders route
+# Allows user to trade shares of a stock
+@routes.post('/orders')
+async def handle_transaction(request):
+    # Parse the JSON sent with the post request
+    requestJSON = await request.json()
+    stockName = requestJSON["name"]
+    quantity = requestJSON["quantity"]
+    transactionType = requestJSON["type"]
+
+    # Format the JSON to send to the order service
+    orderJsonBody = {
+        "name": stockName,
+        "quantity": quantity
+    }
+
+    # Format the error message
+    errorMsg = {
+        "error": {
+            "code": 500,
+            "message": "could not trade stock"
+        }
+    }
+
+    # Attempt to trade the stock
+    if transactionType not in ('buy', 'sell'): # Invalid transaction type
+        return web.json_response(errorMsg, status=500)
+    orderRes = await send_order_request(transactionType, orderJsonBody)
+
+    # Check response from order service for errors
+    if orderRes is None: # Case where no order service replica could be reached
+        return web.json_response(errorMsg, status=500)
+
+    status, resJSON = orderRes
+    if status == 404: # Case where a requested stock to trade could not be found
+        # Return a 404 message stating the requested stock does not exist and can't be traded
+        return web.json_response({
+            "error": {
+                "code": 404,
+                "message": "requested stock could not be traded because it could not be found"
+            }
+        }, status=404)
+    elif status == 504: # Case where the catalog did not reply in time, so the trade may have been made
+        # Forward the error, and drop the stock from the cache since it may have changed
+        invalidate_stock(cache, lookups, stockName)
+        return web.json_response({
+            "error": {
+                "code": 504,
+                "message": "catalog did not reply in time; the trade may have been made"
+            }
+        }, status=504)
+    elif status >= 400 or "error" in resJSON: # Case where some failure or error occurred with the order service
+        # Return a 500 message stating that the order service has failed
+        return web.json_response(errorMsg, status=500)
+    else:
+        # The trade changed the stock, so remove it from the cache right away
+        # The catalog's invalidation arrives asynchronously, and the client should see its own trade
+        invalidate_stock(cache, lookups, stockName)
+
+        # Remember the new order, so looking it up later does not need to reach the order service
+        cache_order(orderCache, resJSON["transaction-number"], {"name": stockName, "quantity": quantity, "type": transactionType})
+        return web.json_response({"data": resJSON})
+
+# POST /orders/batch route
+# Allows user to trade shares of many stocks with one request
+# Every order is forwarded to the order service in one request, and the reply holds the result of each order, in order
+@routes.post('/orders/batch')
+async def handle_batch_transaction(request):
+    # Parse the list of orders sent with the post request
+    requestJSON = await request.json()
+    orders = requestJSON["orders"]
+
+    # Format the error message
+    errorMsg = {
+        "error": {
+            "code": 500,
+            "message": "could not trade stock"
+        }
+    }
+
+    # Only forward orders with a valid transaction type; the rest fail without reaching the order service
+    trades = []
+    for order in orders:
+        if order["type"] in ('buy', 'sell'):
+            trades.append({
+                "name": order["name"],
+                "quantity": order["quantity"],
+                "type": order["type"]
+            })
+
+    # Trade every valid order at once
+    tradeResults = []
+    if trades:
+        orderRes = await send_order_request('trade-batch', {"trades": trades})
+        if orderRes is None or orderRes[0] >= 400: # Case where some failure or error occurred with the order service
+            return web.json_response(errorMsg, status=500)
+        tradeResults = orderRes[1]["results"]
+
+    # Match each result from the order service back to its order
+    results = []
+    nextResult = 0
+    for order in orders:
+        if order["type"] not in ('buy', 'sell'):
+            results.append(errorMsg)
+            continue
+
+        result = tradeResults[nextResult]
+        nextResult += 1
+        if "transaction-number" in result:
+            # The trade changed the stock, so remove it from the cache right away
+            invalidate_stock(cache, lookups, order["name"])
+            cache_order(orderCache, result["transaction-number"], order)
+        results.append(result)
+
+    return web.json_response({"data": {"results": results}})
+
+# Route for handling retrieving orders by order number
+@routes.get('/orders/{orderNum}')
+async def get_order(request):
+    orderNum = request.match_info["orderNum"]
+
+    # Committed orders never change, so serve the order from the order cache if it is there
+    cachedOrder, _ = orderCache.fetch(str(orderNum))
+    if cachedOrder is not None:
+        return web.json_response({"data": cachedOrder})
+
+    orderRes = None
+    if ORDER_READ_ROUTING == 'followers':
+        # Send the lookup to a follower that has the order, so the leader is left to handle trades
+        orderRes = await lookup_order_on_follower(orderNum)
+
+    if orderRes is None:
+        # Send a lookup-order request to the lead order service
+        orderRes = await send_order_request(None, None, send_post=False, orderNum=orderNum)
+
+    # Return message to client based on what the order service sent
+    if orderRes is not None and orderRes[0] == 404: # Case where order with orderNum could not be found
+        # Return a 404 with the given message
+        errMsg = f"could not find order with number {orderNum}"
+        return web.json_response({
+            "error": {
+                "code": 404,
+                "message": errMsg
+            }
+        }, status=404)
+    elif orderRes is None or orderRes[0] >= 400: # Case where some other error occurred
+        # Return a 500 with the given message
+        errMsg = f"error occurred while retrieving order with number {orderNum}"
+        return web.json_response({
+            "error": {
+                "code": 500,
+                "message": errMsg
+            }
+        }, status=500)
+    else:
+        # Request succeeded, so cache and return the order
+        orderJSON = orderRes[1]
+        cache_order(orderCache, orderNum, orderJSON)
+        return web.json_response({
+            "data": {
+                "number": orderNum,
+                "name": orderJSON["name"],
+                "quantity": orderJSON["quantity"],
+                "type": orderJSON["type"]
+            }
+        })
+
+# POST /invalidate/<stock_name> route
+# Allows catalog service to inform front end of which stock to invalidate from the cache
+@routes.post('/invalidate/{stockName}')
+async def handle_invalidation(request):
+    stockName = request.match_info["stockName"]
+
+    # Invalidate the given stock from the cache
+    if invalidate_stock(cache, lookups, stockName):
+        # If the invalidation was successful, return a success message
+        return web.json_response({
+            "success": {
+                "code": 200,
+                "message": "successfully removed stock"
+            }
+        })
+    else:
+        # If the stock was unable to be invalidated, return an error message
+        # A stock may be unable to be invalidated if it isn't in the cache
+        return web.json_response({
+            "error": {
+                "code": 500,
+                "message": "failed to remove stock"
+            }
+        }, status=500)
+
+# POST /invalidate route
+# Allows catalog service to invalidate a batch of stocks from the cache in one request
+@routes.post('/invalidate')
+async def handle_batch_invalidation(request):
+    # Parse the names of the stocks to invalidate
+    requestJSON = await request.json()
+    stockNames = requestJSON["names"]
+
+    # Invalidate each stock, recording the ones that were in the cache
+    invalidated = []
+    for stockName in stockNames:
+        if invalidate_stock(cache, lookups, stockName):
+            invalidated.append(stockName)
+
+    # A stock that is not in the cache does not need to be removed, so always return success
+    return web.json_response({
+        "success": {
+            "code": 200,
+            "message": "successfully removed stocks",
+            "invalidated": invalidated
+        }
+    })
+
+""" Routes for testing """
+# Get the host and port of the leader replica
+@routes.get('/leader')
+async def get_leader(request):
+    leaderHost, leaderPort = ORDER_SERVERS.get(replicas.leaderID, (None, None))
+    return web.json_response({"leader-host": leaderHost, "leader-port": leaderPort})
+
+# Return the contents of the cache
+@routes.get('/dump-cache')
+async def dump_cache(request):
+    return web.json_response(cache.dump())
+
+""" END AIOHTTP APP """
+
+# Background task that subscribes to the catalog's invalidation stream, and reconnects whenever it is lost
+# On reconnecting, the ID of the last event received is sent so the catalog can resend the events that were missed
+async def run_invalidation_subscriber():
+    parser = EventStreamParser()
+    handleEvent = partial(handle_stream_event, cache, lookups)
+    streamTimeout = aiohttp.ClientTimeout(sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=INVALIDATION_STREAM_TIMEOUT)
+    while True:
+        retryDelay = INVALIDATION_RETRY_DELAY
+        try:
+            headers = {}
+            if parser.lastEventID is not None:
+                headers["Last-Event-ID"] = parser.lastEventID
+
+            async with CATALOG_SESSION.get(URL_CATALOG_INVALIDATIONS, headers=headers, timeout=streamTimeout) as res:
+                # The catalog turns subscribers away with a 503 when it has too many
+                turnedAway = res.status == 503
+                if not turnedAway:
+                    res.raise_for_status()
+
+                    # Parse each server-sent event
+                    parser.restart()
+                    async for rawLine in res.content:
+                        parser.parse_line(rawLine.decode().rstrip('\r\n'), handleEvent)
+
+            if turnedAway:
+                # Poll for the events missed instead, so the cache is never left stale, and try subscribing again after the poll interval
+                retryDelay = INVALIDATION_POLL_INTERVAL
+                await poll_invalidations(parser, handleEvent)
+        except asyncio.CancelledError:
+            raise
+        except:
+            pass
+
+        # The stream was lost, so wait before reconnecting
+        await asyncio.sleep(retryDelay)
+
+# Fetch the events published since the last one received, without subscribing to the invalidation stream
+async def poll_invalidations(parser, handleEvent):
+    params = {"after": parser.lastEventID or ''}
+    async with CATALOG_SESSION.get(URL_CATALOG_INVALIDATIONS, params=params) as res:
+        res.raise_for_status()
+        body = await res.text()
+
+    parser.restart()
+    for line in body.splitlines():
+        parser.parse_line(line, handleEvent)
+
+# Open the pooled sessions and choose a leader when the app starts
+async def create_sessions(app):
+    global CATALOG_SESSION
+    CATALOG_SESSION = create_session()
+    for serverID in ORDER_SERVERS:
+        ORDER_SESSIONS[serverID] = create_session()
+
+    # On startup, ping the order servers to determine a leader
+    await ping_order_servers()
+
+    # Only subscribe to invalidations if caching is being used
+    if USE_CACHE:
+        app["invalidationSubscriber"] = asyncio.ensure_future(run_invalidation_subscriber())
+
+    # Keep track of which order replicas are alive
+    app["heartbeat"] = asyncio.ensure_future(run_heartbeat())
+
+# Close the pooled sessions when the app shuts down
+async def close_sessions(app):
+    for taskName in ["invalidationSubscriber", "heartbeat"]:
+        if taskName in app:
+            app[taskName].cancel()
+    await CATALOG_SESSION.close()
+    for serverID in ORDER_SERVERS:
+        await ORDER_SESSIONS[serverID].close()
+
+app = web.Application()
+app.add_routes(routes)
+app.on_startup.append(create_sessions)
+app.on_cleanup.append(close_sessions)
+
+if __name__ == "__main__":
+    # Every request is handled on one event loop, so open client connections only cost a coroutine each
+    # By setting host to 0.0.0.0, allows app to run on all IP addresses associated with machine
+    web.run_app(app, host='0.0.0.0', port=FRONT_PORT)
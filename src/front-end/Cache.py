@@ -1,81 +1,105 @@
 from threading import Lock
+from collections import OrderedDict
+import time
+
+class CacheEntry():
+    def __init__(self, item, expiresAt):
+        # Cached item, and the time after which it is stale (None if it never expires)
+        self.item = item
+        self.expiresAt = expiresAt
+
+        # Set once a refresh of the stale item has been requested, so it is only requested once
+        self.refreshing = False
 
 class LruCache():
-    def __init__(self, cacheSize):
+    def __init__(self, cacheSize, ttl=0, staleTTL=0):
         # Set size of cache
         self.cacheSize = cacheSize
 
-        # Initialize list to store items
-        self.cache = []
+        # Seconds an item is fresh for after it is inserted (0 = items never expire)
+        self.ttl = ttl
+
+        # Seconds an expired item may still be served while it is refreshed (0 = expired items are removed)
+        self.staleTTL = staleTTL
+
+        # Initialize ordered hash map to store items by name
+        # Entries are kept in order of use: the least recently used entry is at the front
+        self.cache = OrderedDict()
 
         # Create a lock
         self.lock = Lock()
-    
+
     def is_full(self):
         # Check if the current size of the cache is equal to the maximum size
-        return len(self.cache) == self.cacheSize
-    
+        return len(self.cache) >= self.cacheSize
+
     """
     Method that attempts to fetch an item from the cache based on its name
-    Returns None if the item is not in the cache, or a dictionary if it is in the cache
+    Returns a tuple of the item (None if it is not in the cache) and whether the caller should refresh it
+    An expired item is still returned within its stale period, and only the first caller to see it is asked to refresh it
     """
     def fetch(self, name):
         self.lock.acquire()
-        # Get the index of the element to fetch
-        index = -1
-        for i in range(len(self.cache)):
-            curEntry = self.cache[i]
-            curName = curEntry["name"]
-            if curName == name:
-                # If the element is found, set index = i and stop loop
-                index = i
-                break
-        
-        # Check if the element was found
         targetElem = None
-        if index >= 0:
-            # Pop the element to return from the cache
-            targetElem = self.cache.pop(index)
+        needsRefresh = False
+        entry = self.cache.get(name)
+
+        # Check if the element was found
+        if entry is not None:
+            now = time.monotonic()
+            if entry.expiresAt is None or now < entry.expiresAt:
+                # The element is fresh
+                targetElem = entry.item
+            elif now < entry.expiresAt + self.staleTTL:
+                # The element is stale, but can be served while it is refreshed
+                targetElem = entry.item
+                needsRefresh = not entry.refreshing
+                entry.refreshing = True
+            # Otherwise the element has expired, and is treated as missing
+            # It is left in the cache so the caller can revalidate it with peek() instead of fetching it again
+
+        if targetElem is not None:
+            # Move the element to the back of the queue
+            self.cache.move_to_end(name)
 
-            # Append targetElem to the back of the queue
-            self.cache.append(targetElem)
-        
         self.lock.release()
         # Return target element
+        return targetElem, needsRefresh
+
+    """
+    Method that returns an item from the cache by name, even if it has expired, without counting as a use
+    Returns None if the item is not in the cache
+    """
+    def peek(self, name):
+        self.lock.acquire()
+        targetElem = None
+        entry = self.cache.get(name)
+        if entry is not None:
+            targetElem = entry.item
+        self.lock.release()
         return targetElem
 
     def evict(self):
-        # Items at the head of the list are least recently used
-        # So pop at element 0
+        # Items at the front of the map are least recently used
+        # So pop the first element
         retVal = None
         try:
-            retVal = self.cache.pop(0)
-        except:
+            retVal = self.cache.popitem(last=False)[1].item
+        except KeyError:
             retVal = None
 
         return retVal
-    
+
     """
     Remove an element from the cache by name
     """
     def invalidate(self, name):
         # Acquire lock
         self.lock.acquire()
-        # Get index of the target element to remove
-        index = -1
-        for i in range(len(self.cache)):
-            curElem = self.cache[i]
-            if curElem["name"] == name:
-                index = i
-                break
-        
-        # Check if the element to invalidate was in the cache
-        successFlag = False
-        if index >= 0:
-            # Remove the element and set the success flag to true
-            self.cache.pop(index)
-            successFlag = True
-        
+
+        # Remove the element if it was in the cache, and mark the invalidation as a success
+        successFlag = self.cache.pop(name, None) is not None
+
         # Release lock
         self.lock.release()
 
@@ -83,19 +107,45 @@ class LruCache():
         return successFlag
 
     """
-    Method that attempts to insert objects into the cache
+    Remove every element from the cache
     """
-    def insert(self, item):
+    def clear(self):
         self.lock.acquire()
-        # Check if the cache is full
-        if self.is_full():
-            # Evict the least recently used element
-            self.evict()
+        self.cache.clear()
+        self.lock.release()
 
-            # Append new item to the end of the cache
-            self.cache.append(item)
+    """
+    Method that attempts to insert objects into the cache
+    Items are stored by their name, unless a different key is given
+    """
+    def insert(self, item, key=None):
+        # Items inserted now are fresh until the TTL has passed
+        expiresAt = None
+        if self.ttl > 0:
+            expiresAt = time.monotonic() + self.ttl
+        entry = CacheEntry(item, expiresAt)
+
+        self.lock.acquire()
+        name = item["name"] if key is None else key
+        if name in self.cache:
+            # Replace the existing entry and move it to the end of the cache
+            self.cache[name] = entry
+            self.cache.move_to_end(name)
         else:
+            # Check if the cache is full
+            if self.is_full():
+                # Evict the least recently used element
+                self.evict()
+
             # Append the item to the end of the cache queue
-            self.cache.append(item)
+            self.cache[name] = entry
         self.lock.release()
 
+    """
+    Method that returns the items in the cache, from least to most recently used
+    """
+    def dump(self):
+        self.lock.acquire()
+        items = [entry.item for entry in self.cache.values()]
+        self.lock.release()
+        return items
@@ -0,0 +1,231 @@
+from threading import Lock
+import json
+import itertools
+
+# For loading .env file
+from dotenv import load_dotenv
+import os
+
+# Configuration and logic shared by FrontEndServer.py and AsyncFrontEndServer.py
+# Nothing here does any I/O, so both front ends make the same decisions whether they run on threads or on an event loop
+
+load_dotenv() # Load in environment variables from .env file
+
+# Get catalog hostname and port from a environment variables
+CATALOG_HOST = os.getenv('CATALOG_HOST')
+CATALOG_PORT = int(os.getenv('CATALOG_PORT'))
+
+# Get order server IDs, hostnames and ports from environment variables in .env
+# The replica IDs are listed in ORDER_IDS, and each replica's hostname and port are given by ORDER_<id>_HOST and ORDER_<id>_PORT
+ORDER_SERVERS = {}
+for serverID in os.getenv('ORDER_IDS', '1,2,3').split(','):
+    serverID = int(serverID)
+    ORDER_SERVERS[serverID] = (os.getenv(f'ORDER_{serverID}_HOST'), int(os.getenv(f'ORDER_{serverID}_PORT')))
+
+# Get the port assigned to the front end service
+FRONT_PORT = int(os.getenv('FRONT_PORT'))
+
+# Where order lookups are sent
+# 'leader' = always the leader
+# 'followers' = spread across followers that are known to have the order, falling back to the leader
+ORDER_READ_ROUTING = os.getenv('ORDER_READ_ROUTING', 'leader')
+
+# Seconds between heartbeats sent to each order replica, and seconds to wait for a replica to answer a heartbeat
+ORDER_HEARTBEAT_INTERVAL = float(os.getenv('ORDER_HEARTBEAT_INTERVAL', '0.5'))
+ORDER_HEARTBEAT_TIMEOUT = float(os.getenv('ORDER_HEARTBEAT_TIMEOUT', '0.5'))
+
+# Number of heartbeats in a row the leader may miss before a new leader is chosen
+ORDER_HEARTBEAT_MISSES = int(os.getenv('ORDER_HEARTBEAT_MISSES', '3'))
+
+# Base URLs for catalog and order services
+URL_CATALOG = f"http://{CATALOG_HOST}:{CATALOG_PORT}"
+URL_CATALOG_INVALIDATIONS = f"{URL_CATALOG}/invalidations"
+
+# Seconds to wait for a message on the catalog's invalidation stream before reconnecting
+# The catalog sends a keep-alive message every CATALOG_STREAM_HEARTBEAT seconds, so this must be longer than that
+INVALIDATION_STREAM_TIMEOUT = float(os.getenv('INVALIDATION_STREAM_TIMEOUT', '15'))
+
+# Seconds to wait before reconnecting to the invalidation stream after it was lost
+INVALIDATION_RETRY_DELAY = float(os.getenv('INVALIDATION_RETRY_DELAY', '1'))
+
+# Seconds between polls for invalidations while the catalog has too many subscribers to let this front end subscribe
+INVALIDATION_POLL_INTERVAL = float(os.getenv('INVALIDATION_POLL_INTERVAL', '0.5'))
+
+# Maximum number of pooled keep-alive connections to each service, and timeouts (in seconds) for requests to them
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '32'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '2'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+
+# Number of stocks the in-memory cache can hold
+CACHE_SIZE = int(os.getenv('CACHE_SIZE', '3'))
+
+# Seconds a cached stock is fresh for (0 = until evicted or invalidated), so a lost invalidation can not leave it stale forever
+CACHE_TTL = float(os.getenv('CACHE_TTL', '0'))
+
+# Seconds past its TTL that a stock is still served from the cache while it is refreshed in the background
+# (0 = expired stocks are fetched from the catalog before replying)
+CACHE_STALE_TTL = float(os.getenv('CACHE_STALE_TTL', '0'))
+
+# Number of order records the in-memory order cache can hold (0 = do not cache orders)
+# Committed orders never change, so they are cached without a TTL, and are only dropped when a new leader is chosen
+ORDER_CACHE_SIZE = int(os.getenv('ORDER_CACHE_SIZE', '1000'))
+
+class ReplicaTracker():
+    def __init__(self, serverIDs, maxMisses):
+        # ID of the current leader, which is unknown until the startup election finds one
+        self.leaderID = None
+
+        # Latest status reported by each replica that answered its last heartbeat, keyed by replica ID
+        # Replicas missing from here are presumed dead, so they are skipped when choosing a new leader or a follower to read from
+        self.replicaStatus = {}
+
+        # Number of heartbeats in a row that each replica has failed to answer
+        self.missedHeartbeats = {}
+        for serverID in serverIDs:
+            self.missedHeartbeats[serverID] = 0
+
+        # Number of heartbeats in a row the leader may miss before a new leader is chosen
+        self.maxMisses = maxMisses
+
+        # Counter used to spread order lookups across followers in turn
+        self.followerCounter = itertools.count()
+
+        # Create a lock
+        self.lock = Lock()
+
+    # Record that the replica with id leaderID is the leader, returning True if it replaced a different leader
+    def set_leader(self, leaderID):
+        self.lock.acquire()
+        leaderChanged = self.leaderID is not None and self.leaderID != leaderID
+        self.leaderID = leaderID
+        self.lock.release()
+        return leaderChanged
+
+    # Record the status a replica reported in answer to a heartbeat
+    def record_heartbeat(self, serverID, statusJSON):
+        self.lock.acquire()
+        self.replicaStatus[serverID] = statusJSON
+        self.missedHeartbeats[serverID] = 0
+        self.lock.release()
+
+    # Record that a replica did not answer a heartbeat in time
+    def record_missed_heartbeat(self, serverID):
+        self.lock.acquire()
+        self.replicaStatus.pop(serverID, None)
+        self.missedHeartbeats[serverID] += 1
+        self.lock.release()
+
+    # Presume a replica is dead until it answers a heartbeat again
+    def mark_dead(self, serverID):
+        self.lock.acquire()
+        self.replicaStatus.pop(serverID, None)
+        self.lock.release()
+
+    # Return the ID of the leader if it has missed too many heartbeats in a row, or None if it has not
+    def get_failed_leader(self):
+        self.lock.acquire()
+        failedLeaderID = None
+        if self.leaderID is not None and self.missedHeartbeats[self.leaderID] >= self.maxMisses:
+            failedLeaderID = self.leaderID
+        self.lock.release()
+        return failedLeaderID
+
+    # Return the IDs of the live replicas in the order they should be tried as the leader, from highest to lowest ID
+    # The replica with id excludeID is left out, since it is the leader being replaced
+    def get_leader_candidates(self, excludeID=None):
+        self.lock.acquire()
+        candidates = [serverID for serverID in sorted(self.replicaStatus, reverse=True) if serverID != excludeID]
+        self.lock.release()
+        return candidates
+
+    # Choose a follower of the current leader that is known to have the order with the given number
+    # Returns None if there is no such follower
+    def choose_follower(self, orderNum):
+        self.lock.acquire()
+        candidates = []
+        for serverID, statusJSON in sorted(self.replicaStatus.items()):
+            # A follower that has not heard of the current leader yet may be missing its orders
+            if serverID != self.leaderID and statusJSON["leader-id"] == self.leaderID and statusJSON["nextID"] > orderNum:
+                candidates.append(serverID)
+        self.lock.release()
+
+        if not candidates:
+            return None
+        return candidates[next(self.followerCounter) % len(candidates)]
+
+class EventStreamParser():
+    def __init__(self):
+        # ID of the last event received, sent when reconnecting so the catalog can resend the events that were missed
+        self.lastEventID = None
+        self.restart()
+
+    # Discard any event left unfinished by a lost stream, before reading from a new one
+    def restart(self):
+        self.eventID = None
+        self.eventType = None
+        self.data = ''
+
+    """
+    Method that parses one line of a stream of server-sent events, made up of lines of fields ending with a blank line
+    The line is given without its line ending
+    Once the blank line ending an event is parsed, handleEvent is called with the event's type and data
+    """
+    def parse_line(self, line, handleEvent):
+        if line == '':
+            if self.eventType is not None:
+                handleEvent(self.eventType, self.data)
+            if self.eventID is not None:
+                self.lastEventID = self.eventID
+            self.restart()
+        elif not line.startswith(':'): # Lines starting with ':' are keep-alive comments
+            field, _, value = line.partition(': ')
+            if field == 'id':
+                self.eventID = value
+            elif field == 'event':
+                self.eventType = value
+            elif field == 'data':
+                self.data += value
+
+# Find the cached copy of a stock, even if it has expired, and the headers that ask the catalog to reply
+# with 304 Not Modified if the copy's version is still current
+def get_revalidation(cache, stockName):
+    cachedJSON = cache.peek(stockName)
+    headers = {}
+    if cachedJSON is not None and "version" in cachedJSON:
+        headers["If-None-Match"] = f'"{cachedJSON["version"]}"'
+    return cachedJSON, headers
+
+# Insert an order record into the order cache, keyed by its order number
+def cache_order(orderCache, orderNum, orderJSON):
+    if ORDER_CACHE_SIZE > 0:
+        orderRecord = {
+            "number": str(orderNum),
+            "name": orderJSON["name"],
+            "quantity": orderJSON["quantity"],
+            "type": orderJSON["type"]
+        }
+        orderCache.insert(orderRecord, key=str(orderNum))
+
+# Remove a stock from the cache, returning True if it was in the cache
+def invalidate_stock(cache, lookups, stockName):
+    # Detach any lookup of the stock that is in flight first, since it may have read the stock before it changed
+    # Requests made from now on send a new lookup, and the old lookup's result is not cached
+    lookups.forget(stockName)
+    return cache.invalidate(stockName)
+
+# Remove every stock from the cache
+def invalidate_all(cache, lookups):
+    lookups.forget_all()
+    for bodyJSON in cache.dump():
+        cache.invalidate(bodyJSON["name"])
+
+# Apply an event received on the catalog's invalidation stream
+def handle_stream_event(cache, lookups, eventType, data):
+    if eventType == 'invalidate':
+        # Remove each stock named in the event
+        for stockName in json.loads(data)["names"]:
+            invalidate_stock(cache, lookups, stockName)
+    elif eventType == 'reset':
+        # The catalog could not send every invalidation missed since the last event received,
+        # so any stock in the cache may be stale
+        invalidate_all(cache, lookups)
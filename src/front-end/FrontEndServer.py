@@ -1,107 +1,241 @@
 from flask import Flask
 from flask import request as FlaskRequest # Not to be confused with requests library
 import requests
+import time
+from functools import partial
+from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor, wait
 from Cache import LruCache
+from SingleFlight import SingleFlight
+from FrontEndCommon import (
+    ORDER_SERVERS, FRONT_PORT, ORDER_READ_ROUTING,
+    ORDER_HEARTBEAT_INTERVAL, ORDER_HEARTBEAT_TIMEOUT, ORDER_HEARTBEAT_MISSES,
+    URL_CATALOG, URL_CATALOG_INVALIDATIONS, INVALIDATION_STREAM_TIMEOUT, INVALIDATION_RETRY_DELAY, INVALIDATION_POLL_INTERVAL,
+    HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT,
+    CACHE_SIZE, CACHE_TTL, CACHE_STALE_TTL, ORDER_CACHE_SIZE,
+    ReplicaTracker, EventStreamParser,
+    get_revalidation, cache_order, invalidate_stock, handle_stream_event
+)
 
-# For loading .env file
-from dotenv import load_dotenv
+# For reading the server settings and the cache flag
 import os
 import sys
 
-load_dotenv() # Load in environment variables from .env file
-
-# Get catalog hostname and port from a environment variables
-CATALOG_HOST = os.getenv('CATALOG_HOST')
-CATALOG_PORT = int(os.getenv('CATALOG_PORT'))
-
 # Option for caching
 # 0 = do not cache lookups
 # 1 = cache lookups
 USE_CACHE = int(sys.argv[1])
 
-# Get order server hostnames and ports from environment variables in .env
-ORDER_SERVERS = {
-    1: (os.getenv('ORDER_1_HOST'), int(os.getenv('ORDER_1_PORT'))),
-    2: (os.getenv('ORDER_2_HOST'), int(os.getenv('ORDER_2_PORT'))),
-    3: (os.getenv('ORDER_3_HOST'), int(os.getenv('ORDER_3_PORT')))
-}
+# Timeouts (in seconds) for connecting to another service, and for it to reply
+HTTP_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+# Server used to run the app: 'development' for Flask's built-in server, or 'production' for Waitress
+SERVER_MODE = os.getenv('SERVER_MODE', 'development')
+
+# Number of threads handling requests, and maximum number of open connections, in production mode
+SERVER_THREADS = int(os.getenv('SERVER_THREADS', '16'))
+SERVER_CONNECTION_LIMIT = int(os.getenv('SERVER_CONNECTION_LIMIT', '1000'))
 
-# Get the port assigned to the front end service
-FRONT_PORT = int(os.getenv('FRONT_PORT'))
+# Create a session that keeps connections to a service alive, so they can be reused across requests
+def create_session():
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount('http://', adapter)
+    return session
 
-# Base URLs for catalog and order services
-URL_CATALOG = f"http://{CATALOG_HOST}:{CATALOG_PORT}"
+# Pooled sessions for the catalog and for each order service replica
+CATALOG_SESSION = create_session()
+ORDER_SESSIONS = {}
+for serverID in ORDER_SERVERS:
+    ORDER_SESSIONS[serverID] = create_session()
 
 """ FLASK APP """
-# Initialize in-memory cache
-CACHE_SIZE = 3
-cache = LruCache(CACHE_SIZE)
+# Initialize in-memory cache with the number of stocks it can hold
+cache = LruCache(CACHE_SIZE, CACHE_TTL, CACHE_STALE_TTL)
+
+# Initialize in-memory cache of order records with the number of orders it can hold
+orderCache = LruCache(ORDER_CACHE_SIZE)
+
+# Catalog lookups in flight, so concurrent cache misses for the same stock share one lookup
+lookups = SingleFlight()
 
 # Initialize flask app
 app = Flask(__name__)
 
+# Long-lived pool of threads that send heartbeats and leader broadcasts to the order replicas, so no thread is started per heartbeat
+# A replica may have a late heartbeat, the next heartbeat and a broadcast in flight at once, so there are three threads per replica
+REPLICA_POOL = ThreadPoolExecutor(max_workers=3 * len(ORDER_SERVERS))
+
 # Function to broadcast to the order replicas that the front end has chosen a leader
 def send_leader_broadcast(leaderID):
-    # Broadcast to order replicas that this server with id leaderID is the leader
+    # Send the broadcast to every other replica at once, on the replica pool
+    futures = []
     for serverID in ORDER_SERVERS:
         if serverID != leaderID:
-            host, port = ORDER_SERVERS[serverID]
-            url = f"http://{host}:{port}/leader-broadcast"
-            attachedJSON = {"leader-id": leaderID}
-            try:
-                # Send message to the corresponding replica
-                requests.post(url, json=attachedJSON)
-            except:
-                # If the replica was unresponsive, simply move on to next replica
-                continue
-
-# Ping command to ping order servers and select a leader
+            futures.append(REPLICA_POOL.submit(send_leader_message, serverID, leaderID))
+
+    # Wait for every replica to answer, but no longer than the heartbeat timeout, so a dead replica does not hold up the election
+    wait(futures, timeout=ORDER_HEARTBEAT_TIMEOUT)
+
+# Tell the replica with id serverID that the replica with id leaderID is the leader
+def send_leader_message(serverID, leaderID):
+    host, port = ORDER_SERVERS[serverID]
+    url = f"http://{host}:{port}/leader-broadcast"
+    attachedJSON = {"leader-id": leaderID}
+    try:
+        # Send message to the corresponding replica, with the heartbeat timeout so a dead replica does not hold up the election
+        ORDER_SESSIONS[serverID].post(url, json=attachedJSON, timeout=ORDER_HEARTBEAT_TIMEOUT)
+    except:
+        # If the replica was unresponsive, simply move on
+        pass
+
+# Record that the replica with id leaderID is the leader, and broadcast it to the other replicas
+def set_leader(leaderID):
+    if replicas.set_leader(leaderID):
+        # The new leader may be missing orders the old leader committed, and give their numbers to new orders,
+        # so the cached order records can no longer be trusted
+        orderCache.clear()
+
+    # Broadcast that a leader has been chosen
+    send_leader_broadcast(leaderID)
+    print(f"Found leader! Order Service {leaderID} at {ORDER_SERVERS[leaderID]}")
+
+"""
+Function that selects a leader among the order replicas
+Every replica is sent a heartbeat at once, so replicas that are down only delay the election by a single timeout
+The live replica with the highest ID is then pinged to make it the leader
+Returns True if a leader was found
+"""
 def ping_order_servers():
-    pingLimit = 5
-    pingOrder = [3, 2, 1] # Ping servers from highest to lowest ID
-    numPings = 0
-    
-    # Attempt to ping the order servers until we reach the ping limit
-    while numPings <= pingLimit:
-        for id in pingOrder:
-            host, port = ORDER_SERVERS[id]
-            url = f"http://{host}:{port}/ping"
-            # Attempt to make contact with the server
-            try:
-                res = requests.get(url)
-                resJSON = res.json()
-                if "success" in resJSON:
-                    # Set the order service leader and return
-                    leaderID = resJSON["success"]["server-id"]
-                    global order_leader
-                    order_leader = (host, port)
-
-                    # Broadcast that a leader has been chosen
-                    send_leader_broadcast(leaderID)
-                    print(f"Found leader! Order Service {leaderID} at {order_leader}")
-                    return True
-                numPings += 1
-            except:
-                # Increment number of pings and continue
-                numPings += 1
-                continue
-    
-    # If we have reached the limit, return False: could not connect to order service
+    probe_replicas()
+
+    # Try the live replicas from highest to lowest ID
+    for candidateID in replicas.get_leader_candidates():
+        if elect_leader(candidateID):
+            return True
+
+    # If no replica answered, return False: could not connect to order service
+    return False
+
+# Leader, and which replicas answered their heartbeats, as last seen by the front end
+replicas = ReplicaTracker(ORDER_SERVERS, ORDER_HEARTBEAT_MISSES)
+
+# Lock held while choosing a new leader, so requests that fail at the same time only start one election
+LEADER_LOCK = Lock()
+
+# Send a heartbeat to the replica with id serverID, and return the status it reports
+def probe_replica(serverID):
+    host, port = ORDER_SERVERS[serverID]
+    url = f"http://{host}:{port}/status"
+    return ORDER_SESSIONS[serverID].get(url, timeout=ORDER_HEARTBEAT_TIMEOUT).json()
+
+# Send a heartbeat to every replica at once, on the replica pool, and record which replicas answered in time
+def probe_replicas():
+    futures = {}
+    for serverID in ORDER_SERVERS:
+        futures[serverID] = REPLICA_POOL.submit(probe_replica, serverID)
+
+    # Every heartbeat shares one deadline, ORDER_HEARTBEAT_TIMEOUT seconds from now
+    # A heartbeat still in flight at the deadline counts as missed, and is left to finish on the pool
+    wait(futures.values(), timeout=ORDER_HEARTBEAT_TIMEOUT)
+    for serverID, future in futures.items():
+        try:
+            replicas.record_heartbeat(serverID, future.result(timeout=0))
+        except:
+            replicas.record_missed_heartbeat(serverID)
+
+# Background thread that sends heartbeats to every replica, so the front end always knows which replicas are alive
+# If the leader misses ORDER_HEARTBEAT_MISSES heartbeats in a row, a new leader is chosen before a trade has to fail
+def run_heartbeat():
+    while True:
+        probe_replicas()
+
+        failedLeaderID = replicas.get_failed_leader()
+        if failedLeaderID is not None:
+            fail_over(failedLeaderID)
+
+        time.sleep(ORDER_HEARTBEAT_INTERVAL)
+
+# Make the replica with id candidateID the leader, returning False if it did not answer
+def elect_leader(candidateID):
+    host, port = ORDER_SERVERS[candidateID]
+    url = f"http://{host}:{port}/ping"
+    try:
+        resJSON = ORDER_SESSIONS[candidateID].get(url, timeout=ORDER_HEARTBEAT_TIMEOUT).json()
+        if "success" in resJSON:
+            set_leader(candidateID)
+            return True
+    except:
+        pass
+
+    # The candidate is dead too, so skip it until it answers a heartbeat again
+    replicas.mark_dead(candidateID)
     return False
 
+"""
+Function that replaces the leader with id failedLeaderID after it stopped responding
+The live replica with the highest ID, as known from the heartbeats, is made the leader with a single ping
+If none of them answer, a new election is run as on startup
+Returns True if a leader was found
+"""
+def fail_over(failedLeaderID):
+    LEADER_LOCK.acquire()
+
+    # Another request may have already replaced the failed leader while this one waited
+    leaderFound = replicas.leaderID != failedLeaderID
+    if not leaderFound:
+        replicas.mark_dead(failedLeaderID)
+
+        # Try the live replicas from highest to lowest ID, as ping_order_servers does
+        for candidateID in replicas.get_leader_candidates(excludeID=failedLeaderID):
+            if elect_leader(candidateID):
+                leaderFound = True
+                break
+
+    if not leaderFound:
+        leaderFound = ping_order_servers()
+
+    LEADER_LOCK.release()
+    return leaderFound
+
+# Attempt to look up an order on a follower instead of the leader
+# Returns the follower's response if it found the order, or None if the lookup should be sent to the leader instead
+def lookup_order_on_follower(orderNum):
+    try:
+        followerID = replicas.choose_follower(int(orderNum))
+    except ValueError:
+        # The order number is not a number, so let the leader reply
+        return None
+    if followerID is None:
+        return None
+
+    host, port = ORDER_SERVERS[followerID]
+    url = f"http://{host}:{port}/lookup-order/{orderNum}"
+    try:
+        res = ORDER_SESSIONS[followerID].get(url, timeout=HTTP_TIMEOUT)
+        # A follower may be missing an order it was never pushed, so only trust it if it found the order
+        if res.status_code == 200:
+            return res
+    except:
+        # Stop sending lookups to the follower until it answers a heartbeat again
+        replicas.mark_dead(followerID)
+    return None
+
 """
 Helper method for sending order requests to the order service
 
 It will attempt to make a connection with the order service leader, and in the event
-it cannot, it will run the ping_order_services function to determine a new leader
+it cannot, it will run the fail_over function to determine a new leader
 """
 def send_order_request(type: str, body, send_post=True, orderNum=-1):
     res = None
     while not res:
         # Attempt to connect with order service and get response
+        leaderID = replicas.leaderID
         try:   
             # Format the url to send an order request
-            leaderHost, leaderPort = order_leader
+            leaderHost, leaderPort = ORDER_SERVERS[leaderID]
+            leaderSession = ORDER_SESSIONS[leaderID]
             
             # Check if front end should send the GET or POST, based on whether /orders was called using GET or POST
             orderUrl = ''
@@ -113,9 +247,9 @@ def send_order_request(type: str, body, send_post=True, orderNum=-1):
             # Send GET or POST to the order service, depending on whether /orders was called using GET or POST
             res = None
             if send_post:
-                res = requests.post(orderUrl, json=body)
+                res = leaderSession.post(orderUrl, json=body, timeout=HTTP_TIMEOUT)
             else:
-                res = requests.get(orderUrl)
+                res = leaderSession.get(orderUrl, timeout=HTTP_TIMEOUT)
 
             # If the response came back as a 404, return it and its error message
             """
@@ -125,10 +259,14 @@ def send_order_request(type: str, body, send_post=True, orderNum=-1):
             """
             if res.status_code >= 400:
                 return res
+        except requests.exceptions.ReadTimeout:
+            # The leader received the request but did not reply in time, so it may still commit the trade
+            # Do not resend it to another leader, since the trade would then be made twice
+            return None
         except:
-            # Case where response was not received due to a failure or timeout
+            # Case where response was not received due to a failure or a connection timeout
             # Attempt to find a new leader
-            leaderFound = ping_order_servers()
+            leaderFound = fail_over(leaderID)
             if not leaderFound:
                 # In the case where a leader could not be found, return None
                 return None
@@ -137,39 +275,117 @@ def send_order_request(type: str, body, send_post=True, orderNum=-1):
     # Return the response
     return res
 
+
+# Look up a stock in the catalog and return the parsed JSON of the response
+def lookup_catalog(stockName):
+    url = f"{URL_CATALOG}/lookup/{stockName}"
+
+    # If an expired copy of the stock is still cached, only ask for the stock if it has changed since
+    cachedJSON, headers = get_revalidation(cache, stockName)
+    catalogRes = CATALOG_SESSION.get(url, headers=headers, timeout=HTTP_TIMEOUT)
+    if catalogRes.status_code == 304:
+        # The cached copy is still current
+        return cachedJSON
+    return catalogRes.json()
+
+# Look up many stocks in the catalog with one request, and return the parsed JSON for each stock keyed by name
+def lookup_catalog_batch(stockNames):
+    url = f"{URL_CATALOG}/lookup-batch"
+    catalogRes = CATALOG_SESSION.get(url, params={"names": ",".join(stockNames)}, timeout=HTTP_TIMEOUT)
+    return dict(zip(stockNames, catalogRes.json()["results"]))
+
+# Insert the result of a catalog lookup into the cache
+def cache_stock(bodyJSON):
+    # Only put entries into the cache if the flag is set, and never cache a failed lookup
+    if USE_CACHE and "error" not in bodyJSON:
+        cache.insert(bodyJSON)
+
+# Look up a stock in the catalog and cache the result, in the background
+def refresh_stock(stockName):
+    try:
+        lookups.do(stockName, lambda: lookup_catalog(stockName), publish=cache_stock)
+    except:
+        # If the refresh failed, the stale stock expires and is fetched again by the next lookup
+        pass
+
+# Fetch a stock from the cache, starting a background refresh if it is stale
+# Returns None if the stock is not in the cache
+def fetch_cached_stock(stockName):
+    bodyJSON, needsRefresh = cache.fetch(stockName)
+    if needsRefresh:
+        # Serve the stale stock now, and fetch the current one from the catalog in the background
+        Thread(target=refresh_stock, args=(stockName,), daemon=True).start()
+    return bodyJSON
+
 """ Routes """
 # GET /stocks/<stockName> route
 # Allows user to look up a stock by name
 @app.get('/stocks/<stockName>')
 def fetch_stock(stockName):
     # Fetch stock from cache
-    bodyJSON = cache.fetch(stockName)
-    inCache = True # Flag signifying if the given stock is in the cache
+    bodyJSON = fetch_cached_stock(stockName)
 
     if not bodyJSON: # Case where stock was not in cache
-        # Mark inCache flag as false
-        inCache = False
-
         # If the specified stock is not in cache, query catalog
-        url = f"{URL_CATALOG}/lookup/{stockName}"
-        catalogRes = requests.get(url)
-
-        # Parse the JSON from the response
-        bodyJSON = catalogRes.json()
+        # If a lookup of the same stock is already in flight, wait for its result instead of sending another
+        bodyJSON = lookups.do(stockName, lambda: lookup_catalog(stockName), publish=cache_stock)
     
     # Format the response to the lookup request and return it
     if "error" in bodyJSON: # Case where lookup failed
         return bodyJSON, 404
     else:
-        if not inCache and USE_CACHE: # Only put entries into the cache if the flag is set
-            # If the stock information was not in the cache, insert it into the cache
-            cache.insert(bodyJSON)
-        
         fetchResponse = {
             "data": bodyJSON
         }
         return fetchResponse
 
+# GET /stocks?names=<name>,<name>,... route
+# Allows user to look up many stocks with one request
+# Stocks in the cache are served from it, and the rest are fetched from the catalog with a single batched lookup
+@app.get('/stocks')
+def fetch_stocks():
+    # Parse the comma-separated list of stock names, ignoring repeated names
+    namesArg = FlaskRequest.args.get('names')
+    if not namesArg:
+        return {
+            "error": {
+                "code": 400,
+                "message": "no stock names given"
+            }
+        }, 400
+    stockNames = list(dict.fromkeys(name for name in namesArg.split(',') if name))
+
+    # Fetch each stock from the cache, and collect the stocks that were not in it
+    results = {}
+    missingNames = []
+    for stockName in stockNames:
+        bodyJSON = fetch_cached_stock(stockName)
+        if bodyJSON:
+            results[stockName] = bodyJSON
+        else:
+            missingNames.append(stockName)
+
+    if missingNames:
+        # Query the catalog for every missing stock at once
+        # Stocks that already have a lookup in flight wait for it instead of being fetched again
+        results.update(lookups.do_many(missingNames, lookup_catalog_batch, publish=cache_stock))
+
+    # Reply with the stocks that were found, in the order they were asked for, and the names of the rest
+    stocks = []
+    notFound = []
+    for stockName in stockNames:
+        if "error" in results[stockName]:
+            notFound.append(stockName)
+        else:
+            stocks.append(results[stockName])
+
+    return {
+        "data": {
+            "stocks": stocks,
+            "not-found": notFound
+        }
+    }
+
 # POST /orders route
 # Allows user to trade shares of a stock
 @app.post('/orders')
@@ -204,7 +420,9 @@ def handle_transaction():
         return errorMsg, 500
     
     # Check response from order service for errors
-    if orderRes.status_code == 404: # Case where a requested stock to trade could not be found
+    if orderRes is None: # Case where no order service replica could be reached, or the leader did not reply in time
+        return errorMsg, 500
+    elif orderRes.status_code == 404: # Case where a requested stock to trade could not be found
         # Return a 404 message stating the requested stock does not exist and can't be traded
         return {
             "error": {
@@ -212,6 +430,15 @@ def handle_transaction():
                 "message": "requested stock could not be traded because it could not be found"
             }
         }, 404
+    elif orderRes.status_code == 504: # Case where the catalog did not reply in time, so the trade may have been made
+        # Forward the error, and drop the stock from the cache since it may have changed
+        invalidate_stock(cache, lookups, stockName)
+        return {
+            "error": {
+                "code": 504,
+                "message": "catalog did not reply in time; the trade may have been made"
+            }
+        }, 504
     elif orderRes.status_code >= 400: # Case where some failure or error occurred with the order service
         # Return a 500 message stating that the order service has failed
         return errorMsg, 500
@@ -221,16 +448,86 @@ def handle_transaction():
     if "error" in resJSON:
         return errorMsg, 500
     else:
+        # The trade changed the stock, so remove it from the cache right away
+        # The catalog's invalidation arrives asynchronously, and the client should see its own trade
+        invalidate_stock(cache, lookups, stockName)
+
+        # Remember the new order, so looking it up later does not need to reach the order service
+        cache_order(orderCache, resJSON["transaction-number"], {"name": stockName, "quantity": quantity, "type": transactionType})
         return {"data": resJSON}
 
+# POST /orders/batch route
+# Allows user to trade shares of many stocks with one request
+# Every order is forwarded to the order service in one request, and the reply holds the result of each order, in order
+@app.post('/orders/batch')
+def handle_batch_transaction():
+    # Parse the list of orders sent with the post request
+    requestJSON = FlaskRequest.get_json()
+    orders = requestJSON["orders"]
+
+    # Format the error message
+    errorMsg = {
+        "error": {
+            "code": 500,
+            "message": "could not trade stock"
+        }
+    }
+
+    # Only forward orders with a valid transaction type; the rest fail without reaching the order service
+    trades = []
+    for order in orders:
+        if order["type"] in ('buy', 'sell'):
+            trades.append({
+                "name": order["name"],
+                "quantity": order["quantity"],
+                "type": order["type"]
+            })
+
+    # Trade every valid order at once
+    tradeResults = []
+    if trades:
+        orderRes = send_order_request('trade-batch', {"trades": trades})
+        if orderRes is None or orderRes.status_code >= 400: # Case where some failure or error occurred with the order service
+            return errorMsg, 500
+        tradeResults = orderRes.json()["results"]
+
+    # Match each result from the order service back to its order
+    results = []
+    nextResult = 0
+    for order in orders:
+        if order["type"] not in ('buy', 'sell'):
+            results.append(errorMsg)
+            continue
+
+        result = tradeResults[nextResult]
+        nextResult += 1
+        if "transaction-number" in result:
+            # The trade changed the stock, so remove it from the cache right away
+            invalidate_stock(cache, lookups, order["name"])
+            cache_order(orderCache, result["transaction-number"], order)
+        results.append(result)
+
+    return {"data": {"results": results}}
+
 # Route for handling retrieving orders by order number
 @app.get('/orders/<orderNum>')
 def get_order(orderNum):
-    # Send a lookup-order request to the lead order service
-    orderRes = send_order_request(None, None, send_post=False, orderNum=orderNum)
+    # Committed orders never change, so serve the order from the order cache if it is there
+    cachedOrder, _ = orderCache.fetch(str(orderNum))
+    if cachedOrder is not None:
+        return {"data": cachedOrder}
+
+    orderRes = None
+    if ORDER_READ_ROUTING == 'followers':
+        # Send the lookup to a follower that has the order, so the leader is left to handle trades
+        orderRes = lookup_order_on_follower(orderNum)
+
+    if orderRes is None:
+        # Send a lookup-order request to the lead order service
+        orderRes = send_order_request(None, None, send_post=False, orderNum=orderNum)
 
     # Return message to client based on what the order service sent
-    if orderRes.status_code == 404: # Case where order with orderNum could not be found
+    if orderRes is not None and orderRes.status_code == 404: # Case where order with orderNum could not be found
         # Return a 404 with the given message
         errMsg = f"could not find order with number {orderNum}"
         return {
@@ -239,7 +536,7 @@ def get_order(orderNum):
                 "message": errMsg
             }
         }, 404
-    elif orderRes.status_code >= 400 or not orderRes: # Case where some other error occurred
+    elif orderRes is None or orderRes.status_code >= 400: # Case where some other error occurred
         # Return a 500 with the given message
         errMsg = f"error occurred while retrieving order with number {orderNum}"
         return {
@@ -249,8 +546,9 @@ def get_order(orderNum):
             }
         }, 500
     else:
-        # Request succeeded, so return the order
+        # Request succeeded, so cache and return the order
         orderJSON = orderRes.json()
+        cache_order(orderCache, orderNum, orderJSON)
         return {
             "data": {
                 "number": orderNum,
@@ -265,7 +563,7 @@ def get_order(orderNum):
 @app.post('/invalidate/<stockName>')
 def handle_invalidation(stockName):
     # Invalidate the given stock from the cache
-    if cache.invalidate(stockName):
+    if invalidate_stock(cache, lookups, stockName):
         # If the invalidation was successful, return a success message
         return {
             "success": {
@@ -283,21 +581,108 @@ def handle_invalidation(stockName):
             }
         }, 500
 
+# POST /invalidate route
+# Allows catalog service to invalidate a batch of stocks from the cache in one request
+@app.post('/invalidate')
+def handle_batch_invalidation():
+    # Parse the names of the stocks to invalidate
+    requestJSON = FlaskRequest.get_json()
+    stockNames = requestJSON["names"]
+
+    # Invalidate each stock, recording the ones that were in the cache
+    invalidated = []
+    for stockName in stockNames:
+        if invalidate_stock(cache, lookups, stockName):
+            invalidated.append(stockName)
+
+    # A stock that is not in the cache does not need to be removed, so always return success
+    return {
+        "success": {
+            "code": 200,
+            "message": "successfully removed stocks",
+            "invalidated": invalidated
+        }
+    }
+
 """ Routes for testing """
 # Get the host and port of the leader replica
 @app.get('/leader')
 def get_leader():
-    return {"leader-host": order_leader[0], "leader-port": order_leader[1]}
+    leaderHost, leaderPort = ORDER_SERVERS.get(replicas.leaderID, (None, None))
+    return {"leader-host": leaderHost, "leader-port": leaderPort}
 
 # Return the contents of the cache
 @app.get('/dump-cache')
 def dump_cache():
-    return cache.cache
+    return cache.dump()
     
+# Background thread that subscribes to the catalog's invalidation stream, and reconnects whenever it is lost
+# On reconnecting, the ID of the last event received is sent so the catalog can resend the events that were missed
+def run_invalidation_subscriber():
+    parser = EventStreamParser()
+    handleEvent = partial(handle_stream_event, cache, lookups)
+    streamSession = create_session()
+    while True:
+        retryDelay = INVALIDATION_RETRY_DELAY
+        try:
+            headers = {}
+            if parser.lastEventID is not None:
+                headers["Last-Event-ID"] = parser.lastEventID
+
+            streamTimeout = (HTTP_CONNECT_TIMEOUT, INVALIDATION_STREAM_TIMEOUT)
+            with streamSession.get(URL_CATALOG_INVALIDATIONS, headers=headers, stream=True, timeout=streamTimeout) as res:
+                # The catalog turns subscribers away with a 503 when it has too many
+                turnedAway = res.status_code == 503
+                if not turnedAway:
+                    res.raise_for_status()
+
+                    # Parse each server-sent event, reading each chunk of the stream whole as soon as the catalog sends it
+                    # The catalog sends the stream with chunked encoding, so events are handled as they arrive without being read a byte at a time
+                    parser.restart()
+                    for line in res.iter_lines(chunk_size=None, decode_unicode=True):
+                        parser.parse_line(line, handleEvent)
+
+            if turnedAway:
+                # Poll for the events missed instead, so the cache is never left stale, and try subscribing again after the poll interval
+                retryDelay = INVALIDATION_POLL_INTERVAL
+                poll_invalidations(streamSession, parser, handleEvent)
+        except:
+            pass
+
+        # The stream was lost, so wait before reconnecting
+        time.sleep(retryDelay)
+
+# Fetch the events published since the last one received, without subscribing to the invalidation stream
+def poll_invalidations(session, parser, handleEvent):
+    params = {"after": parser.lastEventID or ''}
+    res = session.get(URL_CATALOG_INVALIDATIONS, params=params, timeout=HTTP_TIMEOUT)
+    res.raise_for_status()
+
+    parser.restart()
+    for line in res.text.splitlines():
+        parser.parse_line(line, handleEvent)
+
+# Run the app on the given host and port with the server chosen by SERVER_MODE
+def serve_app(host, port):
+    if SERVER_MODE == 'production':
+        # Waitress handles requests on a pool of threads inside this one process,
+        # so every request still shares the same in-memory cache
+        from waitress import serve
+        serve(app, host=host, port=port, threads=SERVER_THREADS, connection_limit=SERVER_CONNECTION_LIMIT)
+    else:
+        app.run(host=host, port=port)
+
 if __name__ == "__main__":
     # On startup, ping the order servers to determine a leader
     ping_order_servers()
 
+    # Only subscribe to invalidations if caching is being used
+    if USE_CACHE:
+        Thread(target=run_invalidation_subscriber, daemon=True).start()
+
+    # Keep track of which order replicas are alive
+    Thread(target=run_heartbeat, daemon=True).start()
+
     # By setting host to 0.0.0.0, allows app to run on all IP addresses associated with machine
     # Also assign the app to the port specified in the environment variables
-    app.run(host='0.0.0.0', port=FRONT_PORT)
\ No newline at end of file
+    serve_app('0.0.0.0', FRONT_PORT)
\ No newline at end of file
@@ -0,0 +1,174 @@
+from threading import Lock, Event
+import asyncio
+
+class Call():
+    def __init__(self):
+        # Result of the call, or the exception it raised, once done is set
+        self.result = None
+        self.error = None
+        self.done = Event()
+
+class SingleFlight():
+    def __init__(self):
+        # Calls currently in flight, keyed by name
+        self.calls = {}
+
+        # Create a lock
+        self.lock = Lock()
+
+    """
+    Method that calls function, unless a call for the same name is already in flight
+    In that case, waits for the call in flight and returns its result (or raises its exception) instead
+    If publish is given, it is called with the result before the call is removed, unless the call was forgotten
+    """
+    def do(self, name, function, publish=None):
+        results = self.do_many([name], lambda names: {name: function()}, publish)
+        return results[name]
+
+    """
+    Method that looks up many names at once, joining the calls already in flight for some of them
+    The remaining names are passed to a single call of function, which must return a dictionary of results keyed by name
+    Returns a dictionary with the result for every name
+    """
+    def do_many(self, names, function, publish=None):
+        # Join the calls in flight for these names, and start one call for the rest
+        self.lock.acquire()
+        calls = {}
+        leadNames = []
+        for name in names:
+            call = self.calls.get(name)
+            if call is None:
+                call = Call()
+                self.calls[name] = call
+                leadNames.append(name)
+            calls[name] = call
+        self.lock.release()
+
+        if leadNames:
+            self.run(leadNames, calls, function, publish)
+
+        # Wait for the calls that were joined, and collect every result
+        results = {}
+        for name in names:
+            call = calls[name]
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            results[name] = call.result
+        return results
+
+    def run(self, leadNames, calls, function, publish):
+        # Make the call and record its result for each name
+        try:
+            results = function(leadNames)
+            for name in leadNames:
+                calls[name].result = results[name]
+        except Exception as e:
+            for name in leadNames:
+                calls[name].error = e
+
+        self.lock.acquire()
+        for name in leadNames:
+            call = calls[name]
+            # Only publish and remove a call if it has not been forgotten while it was in flight
+            if self.calls.get(name) is call:
+                if publish is not None and call.error is None:
+                    publish(call.result)
+                del self.calls[name]
+        self.lock.release()
+
+        # Wake up every request that joined the calls
+        for name in leadNames:
+            calls[name].done.set()
+
+    """
+    Method that detaches the call in flight for a name, so its result is not published
+    Requests made after this start a new call instead of joining the old one
+    """
+    def forget(self, name):
+        self.lock.acquire()
+        self.calls.pop(name, None)
+        self.lock.release()
+
+    """
+    Method that detaches every call in flight
+    """
+    def forget_all(self):
+        self.lock.acquire()
+        self.calls = {}
+        self.lock.release()
+
+class AsyncSingleFlight():
+    def __init__(self):
+        # Futures for the calls currently in flight, keyed by name
+        # Only used from the event loop thread, so no lock is needed
+        self.calls = {}
+
+    """
+    Coroutine with the same behavior as SingleFlight.do, where function is a coroutine function
+    """
+    async def do(self, name, function, publish=None):
+        async def lookup_one(names):
+            return {name: await function()}
+        results = await self.do_many([name], lookup_one, publish)
+        return results[name]
+
+    """
+    Coroutine with the same behavior as SingleFlight.do_many, where function is a coroutine function
+    """
+    async def do_many(self, names, function, publish=None):
+        # Join the calls in flight for these names, and start one call for the rest
+        loop = asyncio.get_running_loop()
+        futures = {}
+        leadNames = []
+        for name in names:
+            future = self.calls.get(name)
+            if future is None:
+                future = loop.create_future()
+                self.calls[name] = future
+                leadNames.append(name)
+            futures[name] = future
+
+        if leadNames:
+            # Make the call in its own task, so a client disconnecting does not cancel it for the other waiters
+            asyncio.ensure_future(self.run(leadNames, futures, function, publish))
+
+        # Wait for every call, and collect the results
+        results = {}
+        for name in names:
+            results[name] = await asyncio.shield(futures[name])
+        return results
+
+    async def run(self, leadNames, futures, function, publish):
+        # Make the call and resolve the future for each name
+        # Everything is done inside the try, so every future is resolved and removed from the calls in flight even if a step fails
+        try:
+            results = await function(leadNames)
+            for name in leadNames:
+                future = futures[name]
+                result = results[name]
+                # Only publish and remove a call if it has not been forgotten while it was in flight
+                if self.calls.get(name) is future:
+                    if publish is not None:
+                        publish(result)
+                    del self.calls[name]
+                future.set_result(result)
+        except Exception as e:
+            for name in leadNames:
+                future = futures[name]
+                if self.calls.get(name) is future:
+                    del self.calls[name]
+                if not future.done():
+                    future.set_exception(e)
+
+    """
+    Method with the same behavior as SingleFlight.forget
+    """
+    def forget(self, name):
+        self.calls.pop(name, None)
+
+    """
+    Method with the same behavior as SingleFlight.forget_all
+    """
+    def forget_all(self):
+        self.calls = {}
@@ -0,0 +1,87 @@
+from threading import Thread, Condition, Event
+import time
+
+class PendingTrade():
+    def __init__(self, trade):
+        # Trade waiting to be committed, and the result it is given once its group has been committed
+        self.trade = trade
+        self.result = None
+
+        # Set once the result is available
+        self.done = Event()
+
+class GroupCommitter():
+    def __init__(self, commitFunction, interval, maxBatch):
+        # Function that commits a list of trades and returns a list with the result of each trade
+        self.commitFunction = commitFunction
+
+        # Seconds to wait for more trades to arrive before committing a group
+        self.interval = interval
+
+        # Maximum number of trades committed in a single group
+        self.maxBatch = maxBatch
+
+        # Trades waiting to be committed, in the order they arrived
+        self.pending = []
+        self.condition = Condition()
+
+        # Start the thread that commits groups of trades
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    """
+    Method that submits a trade to be committed with the next group, and waits for its result
+    """
+    def submit(self, trade):
+        return self.submit_all([trade])[0]
+
+    """
+    Method that submits a list of trades to be committed together, and waits for the result of each one
+    The trades are queued at once, so they are committed in the same group unless it is full
+    """
+    def submit_all(self, trades):
+        pendingTrades = [PendingTrade(trade) for trade in trades]
+
+        self.condition.acquire()
+        self.pending.extend(pendingTrades)
+        self.condition.notify()
+        self.condition.release()
+
+        results = []
+        for pendingTrade in pendingTrades:
+            pendingTrade.done.wait()
+            results.append(pendingTrade.result)
+        return results
+
+    def run(self):
+        while True:
+            # Wait until at least one trade is pending
+            self.condition.acquire()
+            while not self.pending:
+                self.condition.wait()
+            self.condition.release()
+
+            # Let more trades join the group
+            if self.interval > 0:
+                time.sleep(self.interval)
+
+            # Take the next group of trades, leaving the rest for the following group
+            self.condition.acquire()
+            group = self.pending[:self.maxBatch]
+            self.pending = self.pending[self.maxBatch:]
+            self.condition.release()
+
+            # Commit the group, and release every trade waiting on it together
+            results = self.commit(group)
+            for i in range(len(group)):
+                group[i].result = results[i]
+                group[i].done.set()
+
+    def commit(self, group):
+        trades = [pendingTrade.trade for pendingTrade in group]
+        try:
+            return self.commitFunction(trades)
+        except Exception as e:
+            # If the group could not be committed, fail every trade in it
+            print(f"Failed to commit a group of trades: {e}")
+            return [None] * len(group)
@@ -0,0 +1,281 @@
+from threading import Lock
+import json
+import os
+
+class Ledger():
+    def __init__(self, checkpointFile, segmentPrefix, segmentSize):
+        # On-disk checkpoint of the whole ledger, and the prefix of the append-only segment files written since
+        self.checkpointFile = checkpointFile
+        self.segmentPrefix = segmentPrefix
+
+        # Maximum number of entries written to a segment before starting a new one
+        self.segmentSize = segmentSize
+
+        # In-memory copy of the ledger, keyed by transaction ID
+        self.ledger = {}
+        self.nextID = 0
+
+        # Segments that have been filled and closed since the last checkpoint
+        self.closedSegments = []
+
+        # Next transaction ID when the last checkpoint was taken, which is how many entries it covers
+        self.checkpointNextID = 0
+
+        # Set when entries have been written to the current segment but not yet fsync'd
+        self.dirty = False
+
+        # Create a lock
+        self.lock = Lock()
+
+        # Lock held while a checkpoint is written or the ledger is reset, so one never deletes
+        # segments the other is using or overwrites the other's checkpoint
+        self.checkpointLock = Lock()
+
+        # Recover the ledger from disk, then start a new segment for incoming entries
+        self.load()
+        self.segmentIndex = 0
+        if self.closedSegments:
+            self.segmentIndex = self.get_segment_index(self.closedSegments[-1]) + 1
+        self.open_segment()
+
+    def get_segment_name(self, index):
+        return f"{self.segmentPrefix}_{index}.jsonl"
+
+    def get_segment_index(self, fileName):
+        # Parse the index out of a segment file name
+        return int(fileName[len(self.segmentPrefix) + 1:-len(".jsonl")])
+
+    def open_segment(self):
+        # Open the segment with the current index for appending
+        self.segmentFile = self.get_segment_name(self.segmentIndex)
+        self.segmentEntries = 0
+        self.outfile = open(self.segmentFile, 'a')
+
+    """
+    Method that loads the checkpoint and replays every segment written since it
+    Entries are keyed by transaction ID, so replaying an entry that is already in the checkpoint has no effect
+    """
+    def load(self):
+        # A replica that was just added to the cluster has no checkpoint yet, so it starts with an empty ledger
+        # and catches up by synchronizing with the other replicas
+        if os.path.exists(self.checkpointFile):
+            with open(self.checkpointFile, 'r') as infile:
+                checkpoint = json.load(infile)
+            self.ledger = checkpoint["ledger"]
+            self.nextID = checkpoint["nextID"]
+            self.checkpointNextID = self.nextID
+
+        # Find every segment on disk and replay them in the order they were written
+        segments = []
+        for fileName in os.listdir('.'):
+            if fileName.startswith(f"{self.segmentPrefix}_") and fileName.endswith(".jsonl"):
+                segments.append(fileName)
+        segments.sort(key=self.get_segment_index)
+
+        for fileName in segments:
+            with open(fileName, 'r') as infile:
+                for line in infile:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A partially written entry can only be at the end of a segment, so stop here
+                        break
+
+                    id = record.pop("id")
+                    self.ledger[str(id)] = record
+                    self.nextID = max(self.nextID, int(id) + 1)
+
+        self.closedSegments = segments
+
+    """
+    Method that records a new entry in the ledger and appends it to the current segment
+    The entry is handed to the operating system immediately and fsync'd by the next call to sync()
+    """
+    def append(self, id, entry):
+        # Format segment record
+        record = {"id": int(id)}
+        record.update(entry)
+
+        self.lock.acquire()
+        self.outfile.write(json.dumps(record) + '\n')
+        self.outfile.flush()
+        self.dirty = True
+
+        # Update in-memory ledger
+        self.ledger[str(id)] = entry
+        self.nextID = max(self.nextID, int(id) + 1)
+
+        # Start a new segment once the current one is full
+        self.segmentEntries += 1
+        if self.segmentEntries >= self.segmentSize:
+            self.roll_segment()
+        self.lock.release()
+
+    """
+    Method that records a contiguous range of entries, starting at transaction ID startID, with a single write
+    """
+    def append_batch(self, startID, entries):
+        entriesByID = {}
+        for offset in range(len(entries)):
+            entriesByID[int(startID) + offset] = entries[offset]
+        self.append_entries(entriesByID)
+
+    """
+    Method that records a dictionary of entries, keyed by transaction ID, with a single write
+    """
+    def append_entries(self, entriesByID):
+        # Format segment records
+        lines = []
+        for id in entriesByID:
+            record = {"id": int(id)}
+            record.update(entriesByID[id])
+            lines.append(json.dumps(record) + '\n')
+
+        self.lock.acquire()
+        self.outfile.write(''.join(lines))
+        self.outfile.flush()
+        self.dirty = True
+
+        # Update in-memory ledger
+        for id in entriesByID:
+            self.ledger[str(id)] = entriesByID[id]
+            self.nextID = max(self.nextID, int(id) + 1)
+
+        # Start a new segment once the current one is full
+        self.segmentEntries += len(entriesByID)
+        if self.segmentEntries >= self.segmentSize:
+            self.roll_segment()
+        self.lock.release()
+
+    def roll_segment(self):
+        # Close the current segment and open the next one (lock must be held by caller)
+        os.fsync(self.outfile.fileno())
+        self.outfile.close()
+        self.dirty = False
+
+        self.closedSegments.append(self.segmentFile)
+        self.segmentIndex += 1
+        self.open_segment()
+
+    """
+    Method that forces any appended entries to disk
+    """
+    def sync(self):
+        self.lock.acquire()
+        if self.dirty:
+            os.fsync(self.outfile.fileno())
+            self.dirty = False
+        self.lock.release()
+
+    def lookup(self, id):
+        # Return the entry with the given transaction ID, or None if it is not in the ledger
+        return self.ledger.get(str(id))
+
+    """
+    Method that returns up to limit entries starting at transaction ID startID, keyed by transaction ID
+    Transaction IDs are consecutive, so the range is read directly by ID without scanning the ledger
+    """
+    def get_range(self, startID, limit):
+        self.lock.acquire()
+        endID = min(self.nextID, int(startID) + limit)
+        transactions = {}
+        for id in range(int(startID), endID):
+            entry = self.ledger.get(str(id))
+            if entry is not None:
+                transactions[str(id)] = entry
+        self.lock.release()
+        return transactions, endID
+
+    def get_next_id(self):
+        return self.nextID
+
+    """
+    Method that checks if enough segments have been closed to make a new checkpoint worthwhile
+    Each checkpoint rewrites the whole ledger, so one is only taken once the ledger has also grown by as many
+    entries as the last checkpoint covered: the time spent writing checkpoints stays proportional to the entries appended
+    """
+    def needs_checkpoint(self, threshold):
+        return len(self.closedSegments) >= threshold and self.nextID - self.checkpointNextID >= self.checkpointNextID
+
+    """
+    Method that writes out a new checkpoint and deletes the segments it covers
+    """
+    def checkpoint(self):
+        self.checkpointLock.acquire()
+        try:
+            # Close the current segment, so every entry written so far is in a closed segment
+            self.lock.acquire()
+            self.roll_segment()
+            coveredSegments = self.closedSegments
+            self.closedSegments = []
+            nextID = self.nextID
+            self.lock.release()
+
+            # Write the checkpoint outside of the lock so new entries can still be appended
+            # Entries are never changed once written, and every entry it covers has an ID below nextID,
+            # so the ledger is read directly instead of being copied
+            self.write_checkpoint(nextID, self.ledger)
+            self.checkpointNextID = nextID
+
+            # The closed segments are now covered by the checkpoint
+            for fileName in coveredSegments:
+                os.remove(fileName)
+        finally:
+            # Release the lock even if the checkpoint failed, so later checkpoints are not blocked
+            self.checkpointLock.release()
+
+    """
+    Method that writes a checkpoint holding the entries of ledger with IDs below nextID
+    The checkpoint is written one segment's worth of entries at a time, so the whole ledger is never serialized into memory at once
+    """
+    def write_checkpoint(self, nextID, ledger):
+        # Write the checkpoint to a temporary file and move it into place, so a crash never leaves a partial checkpoint
+        tempFile = f"{self.checkpointFile}.tmp"
+        with open(tempFile, 'w') as outfile:
+            outfile.write(f'{{"nextID": {nextID}, "ledger": {{')
+            separator = ''
+            for startID in range(0, nextID, self.segmentSize):
+                chunk = {}
+                for id in range(startID, min(nextID, startID + self.segmentSize)):
+                    entry = ledger.get(str(id))
+                    if entry is not None:
+                        chunk[str(id)] = entry
+                if chunk:
+                    # Write the chunk's entries without its enclosing braces
+                    outfile.write(separator + json.dumps(chunk)[1:-1])
+                    separator = ', '
+            outfile.write('}}')
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(tempFile, self.checkpointFile)
+
+    """
+    Method that returns a copy of the ledger in the same format as the checkpoint file
+    """
+    def dump(self):
+        self.lock.acquire()
+        dumpedLedger = {
+            "nextID": self.nextID,
+            "ledger": dict(self.ledger)
+        }
+        self.lock.release()
+        return dumpedLedger
+
+    """
+    Method that erases every entry from the ledger, both in memory and on disk
+    """
+    def reset(self):
+        self.checkpointLock.acquire()
+        self.lock.acquire()
+        self.ledger = {}
+        self.nextID = 0
+
+        # Delete every segment and write out an empty checkpoint
+        self.roll_segment()
+        for fileName in self.closedSegments:
+            os.remove(fileName)
+        self.closedSegments = []
+        self.write_checkpoint(0, {})
+        self.checkpointNextID = 0
+        self.lock.release()
+        self.checkpointLock.release()
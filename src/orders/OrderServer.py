@@ -2,17 +2,16 @@ import multiprocessing
 from flask import Flask
 from flask import request
 import requests
-import json
-from threading import Lock
-from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Thread
+import time
+from Ledger import Ledger
+from Replicator import ReplicationWorker
+from GroupCommit import GroupCommitter
 
 import sys
 from dotenv import load_dotenv
 import os
 
-# Initialize maximum number of worker threads
-MAX_THREADS = 32
-
 # FOR TESTING
 # Flag to determine if service should be shut down
 shutdownFlag = False
@@ -21,11 +20,11 @@ shutdownFlag = False
 load_dotenv()
 
 # Initialize host, port, and ID from environment variables or command line
-ORDER_SERVERS = {
-    1: (os.getenv('ORDER_1_HOST'), int(os.getenv('ORDER_1_PORT'))),
-    2: (os.getenv('ORDER_2_HOST'), int(os.getenv('ORDER_2_PORT'))),
-    3: (os.getenv('ORDER_3_HOST'), int(os.getenv('ORDER_3_PORT')))
-}
+# The replica IDs are listed in ORDER_IDS, and each replica's hostname and port are given by ORDER_<id>_HOST and ORDER_<id>_PORT
+ORDER_SERVERS = {}
+for replicaID in os.getenv('ORDER_IDS', '1,2,3').split(','):
+    replicaID = int(replicaID)
+    ORDER_SERVERS[replicaID] = (os.getenv(f'ORDER_{replicaID}_HOST'), int(os.getenv(f'ORDER_{replicaID}_PORT')))
 
 SERVER_ID = int(sys.argv[1])
 ORDER_HOST, ORDER_PORT = ORDER_SERVERS[SERVER_ID]
@@ -36,176 +35,230 @@ CATALOG_PORT = int(os.getenv('CATALOG_PORT'))
 
 # Base URLs
 URL_CATALOG = f"http://{CATALOG_HOST}:{CATALOG_PORT}"
-URL_CATALOG_UPDATE = f"{URL_CATALOG}/update"
-URL_CATALOG_LOOKUP = f"{URL_CATALOG}/lookup"
+URL_CATALOG_TRADE_BATCH = f"{URL_CATALOG}/trade-batch"
+
+# Maximum number of pooled keep-alive connections to each service, and timeouts (in seconds) for requests to them
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '32'))
+HTTP_TIMEOUT = (float(os.getenv('HTTP_CONNECT_TIMEOUT', '2')), float(os.getenv('HTTP_READ_TIMEOUT', '10')))
+
+# Server used to run the app: 'development' for Flask's built-in server, or 'production' for Waitress
+SERVER_MODE = os.getenv('SERVER_MODE', 'development')
+
+# Number of threads handling requests, and maximum number of open connections, in production mode
+SERVER_THREADS = int(os.getenv('SERVER_THREADS', '16'))
+SERVER_CONNECTION_LIMIT = int(os.getenv('SERVER_CONNECTION_LIMIT', '1000'))
+
+# Create a session that keeps connections to a service alive, so they can be reused across requests
+def create_session():
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount('http://', adapter)
+    return session
+
+# Pooled sessions for the catalog and for each order service replica
+CATALOG_SESSION = create_session()
+REPLICA_SESSIONS = {}
+for replicaID in ORDER_SERVERS:
+    REPLICA_SESSIONS[replicaID] = create_session()
+
+# Maximum number of entries waiting to be pushed to a follower
+# Entries past this are not queued, and are read back from the ledger once the follower catches up
+REPLICATION_QUEUE_SIZE = int(os.getenv('ORDER_REPLICATION_QUEUE_SIZE', '1024'))
+
+# Seconds the leader waits before pushing again to a follower that did not answer
+REPLICATION_RETRY_DELAY = float(os.getenv('ORDER_REPLICATION_RETRY_DELAY', '1'))
+
+# Seconds the leader waits for more trades to arrive before committing a group (0 = commit as soon as the previous group is done)
+GROUP_COMMIT_INTERVAL = float(os.getenv('ORDER_GROUP_COMMIT_INTERVAL', '0'))
+
+# Maximum number of trades committed in a single group
+GROUP_COMMIT_MAX_BATCH = int(os.getenv('ORDER_GROUP_COMMIT_MAX_BATCH', '256'))
+
+# Maximum number of transactions returned in one page of a /sync response
+SYNC_PAGE_SIZE = int(os.getenv('ORDER_SYNC_PAGE_SIZE', '1000'))
+
+# Maximum number of entries the leader sends to a follower in a single push
+PUSH_BATCH_SIZE = int(os.getenv('ORDER_PUSH_BATCH_SIZE', '256'))
+
+# Replication workers for every other replica, started when the server starts
+REPLICATION_WORKERS = {}
 
 # Database lock
 DB_LOCK = Lock()
 
-# On-disk database file
+# On-disk database file (checkpoint of the ledger) and prefix of the segment files appended to since the checkpoint
 DB_FILENAME = f"order{SERVER_ID}_database.json"
+SEGMENT_PREFIX = f"order{SERVER_ID}_segment"
+
+# Number of entries written to a segment file before starting a new one
+SEGMENT_SIZE = int(os.getenv('ORDER_SEGMENT_SIZE', '1000'))
+
+# Number of closed segments after which a new checkpoint is written, once the ledger has also grown by as many entries as the last checkpoint held
+CHECKPOINT_SEGMENTS = int(os.getenv('ORDER_CHECKPOINT_SEGMENTS', '16'))
+
+# Seconds between checks of whether a new checkpoint is needed
+CHECKPOINT_CHECK_INTERVAL = float(os.getenv('ORDER_CHECKPOINT_CHECK_INTERVAL', '1'))
 
 """ FLASK APP """
 app = Flask(__name__)
 
-def request_lookup(stockName):
-    # Send a lookup request to the catalog
-    url = f"{URL_CATALOG_LOOKUP}/{stockName}"
-    lookupRes = requests.get(url)
-    resJSON = lookupRes.json()
-
-    # Return the response from the lookup
-    return resJSON
+def request_trade_batch(trades):
+    # Send a group of trades to the catalog in one request, and return the result of each trade
+    # The catalog checks that there are enough shares and updates the stock in one step for each trade
+    try:
+        tradeRes = CATALOG_SESSION.post(URL_CATALOG_TRADE_BATCH, json={"trades": trades}, timeout=HTTP_TIMEOUT)
+        return tradeRes.json()["results"]
+    except requests.exceptions.ReadTimeout:
+        # The catalog received the trades but did not reply in time, so it may still have applied them
+        # Report that the outcome is unknown rather than that the trades failed, so they are not simply made again
+        errorJSON = {
+            "error": {
+                "code": 504,
+                "message": "catalog did not reply in time; the trade may have been made"
+            }
+        }
+        return [errorJSON] * len(trades)
+    except:
+        # The catalog could not be reached, so every trade fails
+        errorJSON = {
+            "error": {
+                "code": 500,
+                "message": "could not reach catalog"
+            }
+        }
+        return [errorJSON] * len(trades)
 
-def request_update(stockName, quantity, type):
-    # Format JSON to send in update request
-    updateJSON = {
+# Helper method for broadcasting push messages
+# Must be called while DB_LOCK is held, so entries are queued to each follower in transaction order
+def broadcast_push(stockName, quantity, id, type):
+    # Format ledger entry
+    entry = {
         "name": stockName,
         "quantity": quantity,
         "type": type
     }
 
-    # Send update request and return response
-    updateRes = requests.post(URL_CATALOG_UPDATE, json=updateJSON)
-    return updateRes.json()
-
-# Helper method for broadcasting push messages
-def broadcast_push(stockName, quantity, id, type):
-    with ThreadPoolExecutor(max_workers=MAX_THREADS) as executor:
-        for replicaID in ORDER_SERVERS:
-            if replicaID != leader_id:
-                # Format push JSON
-                pushJSON = {
-                    "nextID": id,
-                    "entry": {
-                        "name": stockName,
-                        "quantity": quantity,
-                        "type": type
-                    }
-                }
-
-                # Submit task to thread pool executor
-                executor.submit(send_push, pushJSON, replicaID)
-
-def send_push(bodyJson, replicaID):
-    # Get the host and port of the replica to send the push request to
-    replicaHost, replicaPort = ORDER_SERVERS[replicaID]
-
-    # Format URL
-    url = f"http://{replicaHost}:{replicaPort}/push"
+    # Queue the entry with each follower's replication worker, which pushes it in the background
+    for replicaID in REPLICATION_WORKERS:
+        if replicaID != get_leader_id():
+            REPLICATION_WORKERS[replicaID].push(id, entry)
 
-    # Attempt to send push broadcast
-    try:
-        requests.post(url, json=bodyJson)
-    except:
-        # If a replica did not respond, simply exit
-        return
+def start_replication_workers():
+    # Start a replication worker for each replica other than this one
+    for replicaID in ORDER_SERVERS:
+        if replicaID != SERVER_ID:
+            replicaHost, replicaPort = ORDER_SERVERS[replicaID]
+            url = f"http://{replicaHost}:{replicaPort}"
+            REPLICATION_WORKERS[replicaID] = ReplicationWorker(url, REPLICA_SESSIONS[replicaID], HTTP_TIMEOUT, REPLICATION_QUEUE_SIZE,
+                                                               PUSH_BATCH_SIZE, ledger.get_range, REPLICATION_RETRY_DELAY)
 
 # Helper function for synchronizing with other replicas
 def synchronize():
     # Send a synchronize request to the other replicas
     DB_LOCK.acquire()
     for replicaID in ORDER_SERVERS:
+        if replicaID == SERVER_ID:
+            continue
         curHost, curPort = ORDER_SERVERS[replicaID]
         url = f"http://{curHost}:{curPort}/sync"
 
         try:
-            # Read in database and get the ID for the next transaction
-            memoryDB = read_database()
-            nextID = memoryDB["nextID"]
+            # Pull the missed transactions one page at a time, starting from the ID for the next transaction
+            lastID = ledger.get_next_id()
+            morePages = True
+            while morePages:
+                # Attempt to send request to current replica
+                syncParams = {
+                    "lastID": lastID,
+                    "limit": SYNC_PAGE_SIZE
+                }
+                syncRes = REPLICA_SESSIONS[replicaID].get(url, params=syncParams, timeout=HTTP_TIMEOUT)
 
-            # Format JSON to send
-            syncBody = {
-                "lastID": nextID
-            }
+                # Parse the json
+                syncJSON = syncRes.json()
+                curLeaderID = syncJSON["leader-id"]
+                if curLeaderID > 0: # Case where a leader has already been chosen
+                    # Set the leader id, leader host, and leader port
+                    global leader_id
+                    leader_id = curLeaderID
+
+                    global leader_host, leader_port
+                    leader_host, leader_port = ORDER_SERVERS[leader_id]
 
-            # Attempt to send request to current replica
-            syncRes = requests.get(url, json=syncBody)
+                # Save the transactions in this page to the database
+                missedTransactions = syncJSON["transactions"]
+                if missedTransactions:
+                    ledger.append_entries(missedTransactions)
 
-            # Parse the json
-            syncJSON = syncRes.json()
-            curLeaderID = syncJSON["leader-id"]
-            if curLeaderID > 0: # Case where a leader has already been chosen
-                # Set the leader id, leader host, and leader port
-                global leader_id
-                leader_id = curLeaderID
+                # Continue from the end of this page until the replica has no more transactions
+                lastID = syncJSON["next-page"]
+                morePages = lastID < syncJSON["nextID"]
 
-                global leader_host, leader_port
-                leader_host, leader_port = ORDER_SERVERS[leader_id]
+            if curLeaderID > 0:
                 print(f"Leader: Replica #{curLeaderID} at {curHost}:{curPort}")
-            
-            # Get transactions since lastID
-            missedTransactions = syncJSON["transactions"]
-            for tid in missedTransactions:
-                # Parse the information from the missed transaction
-                curTransaction = missedTransactions[tid]
-                name = curTransaction["name"]
-                type = curTransaction["type"]
-                quantity = curTransaction["quantity"]
-
-                # Save the transaction to the database
-                save_database(name, quantity, type, tid)
         except:
             continue
 
+    # Force the synchronized transactions to disk
+    ledger.sync()
     DB_LOCK.release()
 
 
-def read_database():
-    # Read in database from disk
-    memoryDB = {}
-    with open(DB_FILENAME, 'r') as infile:
-        memoryDB = json.load(infile)
-    return memoryDB
+# Background thread that writes a checkpoint once enough segments have been closed
+def run_ledger_checkpointer():
+    while True:
+        time.sleep(CHECKPOINT_CHECK_INTERVAL)
 
-def save_database(stockName, quantity, type, id):
-    # Create ledger entry
-    ledgerEntry = {
-        "name": stockName,
-        "quantity": quantity,
-        "type": type
-    }
-
-    # Calculate next ID to use
-    nextID = int(id) + 1
-
-    # Read in current state of the database
-    memoryDB = read_database()
-
-    # Update and write out database to disk
-    memoryDB["ledger"][id] = ledgerEntry
-    memoryDB["nextID"] = nextID
-
-    with open(DB_FILENAME, 'w') as outfile:
-        outfile.write(json.dumps(memoryDB, indent=4))
+        try:
+            if ledger.needs_checkpoint(CHECKPOINT_SEGMENTS):
+                ledger.checkpoint()
+        except Exception as e:
+            # Keep checking after a failure, so a checkpoint is still written later
+            print(f"Failed to checkpoint the ledger: {e}")
 
 """ Routes """
-@app.post('/buy')
-# Route for buying stocks
-def handle_buy():
-    # Parse information from request JSON
-    reqJSON = request.get_json()
-    stockName = reqJSON["name"]
-    quantity = reqJSON["quantity"]
+# Commit a group of trades: apply them to the catalog in one round trip, then record the
+# successful ones in the ledger with a single write and queue them to the followers
+# Returns a list with the result of each trade
+def commit_trades(trades):
+    catalogResults = request_trade_batch(trades)
 
-    # Request stock information from the catalog
-    lookupJSON = request_lookup(stockName)
-
-    # Check if an error occurred with the lookup
-    if "error" in lookupJSON:
-        # If an error occurred with the lookup, forward it to the front end
-        errorObj = lookupJSON["error"]
-        code = errorObj["code"]
-        return lookupJSON, code
-    
     """ Begin Critical Region """
     DB_LOCK.acquire()
+    try:
+        # Give each successful trade the next transaction id, in the order the trades arrived
+        nextID = ledger.get_next_id()
+        entriesByID = {}
+        results = []
+        for i in range(len(trades)):
+            if "success" in catalogResults[i]:
+                entriesByID[nextID] = trades[i]
+                results.append({"transaction-number": nextID})
+                nextID += 1
+            else:
+                results.append(catalogResults[i])
+
+        if entriesByID:
+            # Update database once for the whole group, and force it to disk with a single fsync
+            # so every trade in the group is durable locally before its request is released
+            ledger.append_entries(entriesByID)
+            ledger.sync()
+
+            # Queue push messages to the followers
+            for id in entriesByID:
+                curTrade = entriesByID[id]
+                broadcast_push(curTrade["name"], curTrade["quantity"], id, curTrade["type"])
+    finally:
+        # Release database lock, even if the ledger could not be written
+        DB_LOCK.release()
+    """ End critical region """
 
-    # Read next transaction id from database
-    memoryDB = read_database()
-    nextID = memoryDB["nextID"]
-    
-    # Format error and success messages
+    return results
+
+# Format the reply to a trade from the result it was given by the group committer
+# Returns the reply and its status code
+def format_trade_result(result):
+    # Format error message
     errorMsg = {
         "error": {
             "code": 500,
@@ -213,34 +266,44 @@ def handle_buy():
         }
     }
 
-    successMsg = {
-        "transaction-number": nextID
-    }
-
-    successFlag = False # Set flag if update is a success
+    if result is None:
+        # The group could not be committed
+        return errorMsg, 200
+    elif "transaction-number" in result:
+        # If the trade was a success, return its transaction number
+        return result, 200
+    elif result["error"]["code"] == 404:
+        # If the stock does not exist, forward the error to the front end
+        return result, 404
+    elif result["error"]["code"] == 504:
+        # If the catalog did not reply in time, forward the error so the trade is not reported as failed
+        return result, 504
+    else:
+        # Trade was not successful
+        return errorMsg, 200
 
-    # Check if there are enough shares to sell
-    remainingShares = lookupJSON["quantity"]
+# Helper method for trading a stock and recording the trade in the ledger
+def execute_trade(stockName, quantity, type):
+    # Submit the trade to be committed with the next group, and wait for the group to be committed
+    # The entry is durable locally once this returns, so there is no need to wait for the followers
+    tradeJSON = {
+        "name": stockName,
+        "quantity": quantity,
+        "type": type
+    }
+    result = committer.submit(tradeJSON)
+    return format_trade_result(result)
 
-    if remainingShares >= quantity:
-        # If there are enough shares to be bought, send update request
-        updateResJSON = request_update(stockName, quantity, 'buy')
-        if "success" in updateResJSON: # Case where update succeeds
-            # Update database and return success message
-            save_database(stockName, quantity, 'buy', nextID)
-            successFlag = True
-    
-    # Release database lock
-    DB_LOCK.release()
-    """ End critical region """
+@app.post('/buy')
+# Route for buying stocks
+def handle_buy():
+    # Parse information from request JSON
+    reqJSON = request.get_json()
+    stockName = reqJSON["name"]
+    quantity = reqJSON["quantity"]
 
-    if successFlag:
-        # If the trade was a success, broadcast push and return success
-        broadcast_push(stockName, quantity, nextID, 'buy')
-        return successMsg
-    else:
-        # Trade was not successful
-        return errorMsg
+    # Buy the stock
+    return execute_trade(stockName, quantity, 'buy')
 
 @app.post('/sell')
 def handle_sell():
@@ -249,73 +312,36 @@ def handle_sell():
     stockName = reqJSON["name"]
     quantity = reqJSON["quantity"]
 
-    # Send lookup request to catalog server
-    lookupResJSON = request_lookup(stockName)
-
-    # Check if there was an error when looking up the stock
-    if "error" in lookupResJSON:
-        # If there was an error with the lookup, return the error message and the code
-        errorObj = lookupResJSON["error"]
-        code = errorObj["code"]
-        return lookupResJSON, code
-    
-    """ Begin critical region """
-    # Acquire database lock
-    DB_LOCK.acquire()
-
-    # Read next transaction id from database
-    memoryDB = read_database()
-    nextID = memoryDB["nextID"]
-    
-    # Format error and success messages
-    errMsg = {
-        "error": {
-            "code": 500,
-            "message": "could not trade stock"
-        }
-    }
-
-    successMsg = {
-        "transaction-number": nextID
-    }
-
-    # If no error occurred, attempt update stock in catalog
-    updateResJSON = request_update(stockName, quantity, 'sell')
-    successFlag = False # Set this flag if the update was a success
-
-    if "success" in updateResJSON: # If the update was a success, set the flag to true and update the database
-        successFlag = True
-        save_database(stockName, quantity, 'sell', nextID)
-    
-    # Release database lock
-    DB_LOCK.release()
-    """ End of critical region """
+    # Sell the stock
+    return execute_trade(stockName, quantity, 'sell')
 
-    # Determine which message to send
-    if successFlag:
-        # Transaction was successful, so send a success and send push messages
-        broadcast_push(stockName, quantity, nextID, 'sell')
-        return successMsg
-    else:
-        # Transaction was unsuccessful, so send an error
-        return errMsg
+# Route for trading a list of stocks with one request
+# The trades are submitted to the group committer together, and the reply holds the result of each one, in order
+@app.post('/trade-batch')
+def handle_trade_batch():
+    # Parse the list of trades from the request
+    reqJSON = request.get_json()
+    trades = []
+    for curTrade in reqJSON["trades"]:
+        trades.append({
+            "name": curTrade["name"],
+            "quantity": curTrade["quantity"],
+            "type": curTrade["type"]
+        })
+
+    # Commit the trades and wait for all of them
+    results = []
+    for result in committer.submit_all(trades):
+        tradeResult, code = format_trade_result(result)
+        results.append(tradeResult)
+
+    return {"results": results}
 
 # Route for handling order lookups by number
 @app.get('/lookup-order/<orderNum>')
 def handle_lookup_order(orderNum):
-    # Search the database for the requested order number
-    """ Begin critical section """
-    DB_LOCK.acquire()
-    memoryDB = read_database()
-    ledger = memoryDB["ledger"]
-
-    targetEntry = None
-    if orderNum in ledger:
-        # If the requested order number is in the ledger, set it as the target
-        targetEntry = ledger[str(orderNum)]
-    
-    DB_LOCK.release()
-    """ End critical section """
+    # Search the ledger for the requested order number
+    targetEntry = ledger.lookup(orderNum)
 
     # Return error or success message based on whether requested number was in ledger
     if targetEntry: # Case where order with requested number was found
@@ -361,6 +387,25 @@ def handle_ping():
         }
     }
 
+# Get the ID of the leader, or -1 if no leader is known yet
+def get_leader_id():
+    try:
+        # Get the globally stored leader id
+        return leader_id
+    except NameError:
+        # If the leader_id has not been initialized, return -1
+        return -1
+
+# Route for reporting this replica's state without changing it
+# Unlike /ping, this does not make the replica the leader, so the front end can poll it at any time
+@app.get('/status')
+def handle_status():
+    return {
+        "server-id": SERVER_ID,
+        "leader-id": get_leader_id(),
+        "nextID": ledger.get_next_id()
+    }
+
 @app.post('/leader-broadcast')
 def handle_leader_broadcast():
     # If the replica received a POST message on this route, a leader has been chosen
@@ -386,31 +431,44 @@ def handle_leader_broadcast():
 # Route for handling push requests
 # Whenever the leader makes an update, it will send a push message
 # to each of the replicas to update their databases
+# A push either carries a single entry ("nextID" and "entry"), or a batch of entries with
+# consecutive transaction IDs ("startID" and "entries"), which is applied with a single write
+# A push that starts past this replica's next transaction ID would leave a gap in the ledger, so it is rejected
+# with a 409 holding this replica's next transaction ID, and the leader resends the entries from there
 @app.post('/push')
 def handle_push():
-    # Parse the entry to push into the database
+    # Parse the entries to push into the database
     pushJSON = request.get_json()
-    nextID = pushJSON["nextID"]
-    ledgerEntry = pushJSON["entry"]
+    if "entries" in pushJSON: # Case where a batch of entries was pushed
+        startID = int(pushJSON["startID"])
+        ledgerEntries = pushJSON["entries"]
+    else: # Case where a single entry was pushed
+        startID = int(pushJSON["nextID"])
+        ledgerEntries = [pushJSON["entry"]]
 
     # Acquire database lock
     DB_LOCK.acquire()
-
-    # Read in current state
-    memoryDB = read_database()
-
-    # Add nextID and ledger entry to the database
-    memoryDB["nextID"] = nextID + 1
-    memoryDB["ledger"][nextID] = ledgerEntry
-
-    # Save the database
-    name = ledgerEntry["name"]
-    quantity = ledgerEntry["quantity"]
-    type = ledgerEntry["type"]
-    save_database(name, quantity, type, nextID)
-    
-    # Release database lock
-    DB_LOCK.release()
+    try:
+        nextID = ledger.get_next_id()
+        if startID > nextID:
+            # Entries between this replica's next transaction ID and the start of the push are missing
+            return {
+                "error": {
+                    "code": 409,
+                    "message": "push does not continue the ledger"
+                },
+                "nextID": nextID
+            }, 409
+
+        # Skip the entries this replica already has, which the leader may resend after a push it did not hear back from
+        ledgerEntries = ledgerEntries[nextID - startID:]
+        if ledgerEntries:
+            # Save every new entry to the ledger at once, and force them to disk with a single fsync before returning
+            ledger.append_batch(nextID, ledgerEntries)
+            ledger.sync()
+    finally:
+        # Release database lock
+        DB_LOCK.release()
 
     # Return success message
     return {
@@ -420,47 +478,34 @@ def handle_push():
         }
     }
 
+# Returns one page of at most "limit" transactions starting at "lastID", along with the ID to request
+# the next page from ("next-page") and this replica's next transaction ID ("nextID")
+# Parameters may be sent in the query string or as a JSON body
 @app.get('/sync')
 def handle_sync():
-    # Parse JSON from the sent request
-    syncJSON = request.get_json()
+    # Parse the parameters from the sent request
+    syncJSON = request.args
+    if "lastID" not in syncJSON:
+        syncJSON = request.get_json()
 
-    # Retrieve last known transaction ID from the request
-    lastID = syncJSON["lastID"]
+    # Retrieve last known transaction ID and page size from the request
+    lastID = int(syncJSON["lastID"])
+    limit = max(1, min(int(syncJSON.get("limit", SYNC_PAGE_SIZE)), SYNC_PAGE_SIZE))
 
-    """ Begin critical region """
-    DB_LOCK.acquire()
-
-    # Read in database from file
-    memoryDB = read_database()
-    
-    # Get the ledger and the current transaction ID
-    ledger = memoryDB["ledger"]
-    nextID = memoryDB["nextID"]
-
-    # Get each transaction that occurred since lastID
-    curID = lastID
-    transactions = {}
-    while curID < nextID:
-        transactions[str(curID)] = ledger[str(curID)]
-        curID += 1
-    
-    """ End critical region """
-    DB_LOCK.release()
+    # Get the page of transactions that occurred since lastID
+    # Only the ledger's own lock is held, and only while this page is copied, so live trades are not blocked
+    transactions, nextPageID = ledger.get_range(lastID, limit)
+    nextID = ledger.get_next_id()
 
     # Determine the leader
-    curLeader = SERVER_ID
-    try:
-        # Get the globally stored leader id
-        curLeader = leader_id
-    except:
-        # If the leader_id has not been initialized, set flag to -1
-        curLeader = -1
+    curLeader = get_leader_id()
     
-    # Return a packet containing the current leader and transactions since lastID
+    # Return a packet containing the current leader and a page of transactions since lastID
     return {
         "leader-id": curLeader,
-        "transactions": transactions
+        "transactions": transactions,
+        "next-page": nextPageID,
+        "nextID": nextID
     }
 
 
@@ -477,37 +522,49 @@ def terminate_early():
 # Use for testing only
 @app.get('/dump-database')
 def dump_database():
-    # Read in and return database
-    memoryDB = read_database()
-    return memoryDB
+    # Return the contents of the ledger
+    return ledger.dump()
 
 # Route for resetting contents of database
 # Use for testing only
 @app.post('/reset-database')
 def reset_database():
-    with open(DB_FILENAME, 'w') as outfile:
-        # Re-formatted database
-        reformattedDB = {
-            "nextID": 0,
-            "ledger": {}
-        }
-
-        outfile.write(json.dumps(reformattedDB, indent=4))
-    
-    # Return formatted database
-    memoryDB = read_database()
-    return memoryDB
+    # Erase the ledger and return the formatted database
+    ledger.reset()
+    return ledger.dump()
+
+# Run the app on the given host and port with the server chosen by SERVER_MODE
+def serve_app(host, port):
+    if SERVER_MODE == 'production':
+        # Waitress handles requests on a pool of threads inside this one process,
+        # so every request still shares the same in-memory ledger
+        from waitress import serve
+        serve(app, host=host, port=port, threads=SERVER_THREADS, connection_limit=SERVER_CONNECTION_LIMIT)
+    else:
+        app.run(host=host, port=port)
 
 def run_server(pipe: multiprocessing.Pipe):
     # Initialize a global pipe variable
     global PIPE
     PIPE = pipe
 
+    # Load the ledger from disk and start checkpointing it in the background
+    global ledger
+    ledger = Ledger(DB_FILENAME, SEGMENT_PREFIX, SEGMENT_SIZE)
+    Thread(target=run_ledger_checkpointer, daemon=True).start()
+
     # Attempt to synchronize with other order services first
     synchronize()
 
+    # Start the workers that push new entries to the other replicas
+    start_replication_workers()
+
+    # Start committing trades in groups
+    global committer
+    committer = GroupCommitter(commit_trades, GROUP_COMMIT_INTERVAL, GROUP_COMMIT_MAX_BATCH)
+
     # Start app
-    app.run(host='0.0.0.0', port=ORDER_PORT)
+    serve_app('0.0.0.0', ORDER_PORT)
 
 if __name__ == "__main__":
     """ 
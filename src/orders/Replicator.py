@@ -0,0 +1,125 @@
+from threading import Thread
+from queue import Queue, Empty, Full
+import time
+
+class ReplicationWorker():
+    def __init__(self, replicaUrl, session, timeout, queueSize, batchSize, readRange, retryDelay):
+        # URLs of the follower's /push and /status routes, and the pooled session and timeout used to reach it
+        self.url = f"{replicaUrl}/push"
+        self.statusUrl = f"{replicaUrl}/status"
+        self.session = session
+        self.timeout = timeout
+
+        # Bounded queue of entries waiting to be pushed to the follower, in transaction order
+        self.queue = Queue(maxsize=queueSize)
+
+        # Maximum number of entries sent to the follower in a single push
+        self.batchSize = batchSize
+
+        # Function that reads up to a given number of entries from the leader's ledger, starting at a transaction ID
+        # Used to resend entries that were dropped from the queue or that the follower never acknowledged
+        self.readRange = readRange
+
+        # Seconds to wait before pushing again to a follower that did not answer
+        self.retryDelay = retryDelay
+
+        # Next transaction ID the follower is known to need, or None until the first push is answered
+        # Only entries the follower has acknowledged are ever skipped, so nothing is lost when a push fails
+        self.nextID = None
+
+        # Start the long-lived thread that sends pushes to the follower
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    """
+    Method that queues a ledger entry to be pushed to the follower
+    Never blocks, since it is called while the leader holds DB_LOCK: if the queue is full, the entry is left out,
+    and the worker reads it back from the ledger once it notices the gap
+    """
+    def push(self, id, entry):
+        try:
+            self.queue.put_nowait((id, entry))
+        except Full:
+            pass
+
+    def run(self):
+        while True:
+            # Wait for the next entry, then take every entry that queued up while the previous push was in flight
+            batch = [self.queue.get()]
+            while len(batch) < self.batchSize:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Empty:
+                    break
+
+            # Leave out the entries the follower has already acknowledged
+            if self.nextID is not None:
+                batch = [(id, entry) for id, entry in batch if id >= self.nextID]
+            if not batch:
+                continue
+
+            try:
+                # Push the queued entries if they continue exactly from what the follower has
+                # Otherwise some were left out of the queue, so resend everything from the ledger instead
+                if self.is_contiguous(batch) and self.send_batch(batch):
+                    continue
+            except:
+                # The follower did not answer, so wait before resending
+                time.sleep(self.retryDelay)
+            self.catch_up()
+
+    def is_contiguous(self, batch):
+        # Check that the batch starts at the follower's next transaction ID and has no gaps
+        if self.nextID is not None and batch[0][0] != self.nextID:
+            return False
+        for i in range(1, len(batch)):
+            if batch[i][0] != batch[i - 1][0] + 1:
+                return False
+        return True
+
+    """
+    Method that pushes a batch of (transaction ID, entry) pairs with consecutive IDs to the follower
+    Returns True if the follower applied it, or False if the follower is missing earlier entries
+    Raises an exception if the follower could not be reached or failed to apply the batch
+    """
+    def send_batch(self, batch):
+        # Format push JSON with the first transaction ID and the entries that follow it
+        pushJSON = {
+            "startID": batch[0][0],
+            "entries": [entry for id, entry in batch]
+        }
+        res = self.session.post(self.url, json=pushJSON, timeout=self.timeout)
+
+        if res.status_code == 409:
+            # The push would leave a gap in the follower's ledger, so resend from the follower's next transaction ID
+            self.nextID = res.json()["nextID"]
+            return False
+        res.raise_for_status()
+
+        self.nextID = batch[-1][0] + 1
+        return True
+
+    """
+    Method that resends entries from the leader's ledger until the follower has every entry in it
+    If the follower does not answer, it is retried every retryDelay seconds, so it catches up as soon as it is back
+    """
+    def catch_up(self):
+        while True:
+            try:
+                if self.nextID is None:
+                    # The follower has not answered a push yet, so ask it where its ledger ends
+                    res = self.session.get(self.statusUrl, timeout=self.timeout)
+                    res.raise_for_status()
+                    self.nextID = res.json()["nextID"]
+
+                # Read the entries the follower is missing from the ledger, up to the batch size
+                transactions, endID = self.readRange(self.nextID, self.batchSize)
+                batch = []
+                for id in range(self.nextID, endID):
+                    batch.append((id, transactions[str(id)]))
+                if not batch:
+                    # The follower has every entry in the leader's ledger
+                    return
+                self.send_batch(batch)
+            except:
+                time.sleep(self.retryDelay)
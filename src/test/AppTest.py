@@ -1,5 +1,6 @@
 import requests
 import os
+import time
 from dotenv import load_dotenv
 
 # This test assumes the cache size in the front end is 3
@@ -11,17 +12,22 @@ load_dotenv()
 FRONT_HOST = os.getenv('FRONT_HOST')
 FRONT_PORT = int(os.getenv('FRONT_PORT'))
 
-ORDER_SERVERS = {
-    1: (os.getenv('ORDER_1_HOST'), int(os.getenv('ORDER_1_PORT'))),
-    2: (os.getenv('ORDER_2_HOST'), int(os.getenv('ORDER_2_PORT'))),
-    3: (os.getenv('ORDER_3_HOST'), int(os.getenv('ORDER_3_PORT')))
-}
+ORDER_SERVERS = {}
+for orderRepID in os.getenv('ORDER_IDS', '1,2,3').split(','):
+    orderRepID = int(orderRepID)
+    ORDER_SERVERS[orderRepID] = (os.getenv(f'ORDER_{orderRepID}_HOST'), int(os.getenv(f'ORDER_{orderRepID}_PORT')))
 
 # Initialize URLs to front end endpoints
 URL_BASE = f"http://{FRONT_HOST}:{FRONT_PORT}"
 URL_LOOKUP = f"{URL_BASE}/stocks"
 URL_ORDERS = f"{URL_BASE}/orders"
+URL_ORDERS_BATCH = f"{URL_BASE}/orders/batch"
 URL_CACHE = f"{URL_BASE}/dump-cache"
+URL_INVALIDATE = f"{URL_BASE}/invalidate"
+
+# Number of times to check the order replicas for consistency, and seconds to wait between checks
+REPLICATION_ATTEMPTS = 10
+REPLICATION_DELAY = 0.1
 
 # Set valid and invalid stock options
 VALID_STOCK_OPTION_1 = "GameStart" # Lookup this one
@@ -452,6 +458,138 @@ def test_invalidate():
     print("PASSED: test_invalidate")
     return (True, 'test_invalidate')
 
+# Test that a batch of stocks can be invalidated from the front end's cache in one request
+def test_batch_invalidate():
+    print("BEGIN: test_batch_invalidate")
+    # Lookup 3 valid stocks so they are in the cache
+    for stockName in [VALID_STOCK_OPTION_2, VALID_STOCK_OPTION_3, VALID_STOCK_OPTION_4]:
+        requests.get(f"{URL_LOOKUP}/{stockName}")
+
+    # Invalidate two of the cached stocks and one stock that is not cached
+    invalidateJson = {
+        "names": [VALID_STOCK_OPTION_3, VALID_STOCK_OPTION_4, INVALID_STOCK_OPTION]
+    }
+    invalidateResJson = (requests.post(URL_INVALIDATE, json=invalidateJson)).json()
+
+    # Get state of cache after the invalidation
+    cacheAfter = (requests.get(URL_CACHE)).json()
+
+    try:
+        # Assert that only the cached stocks were reported as invalidated
+        assert("success" in invalidateResJson)
+        invalidated = invalidateResJson["success"]["invalidated"]
+        assert(sorted(invalidated) == sorted([VALID_STOCK_OPTION_3, VALID_STOCK_OPTION_4]))
+
+        # Assert that only VALID_STOCK_OPTION_2 remains in the cache
+        assert(len(cacheAfter) == 1)
+        assert(cacheAfter[0]["name"] == VALID_STOCK_OPTION_2)
+    except:
+        receivedCache = []
+        for entry in cacheAfter:
+            receivedCache.append(entry["name"])
+
+        print("Failed test_batch_invalidate")
+        print(f"Invalidation response: {invalidateResJson}")
+        print(f"State of cache: {receivedCache}\n")
+        return (False, 'test_batch_invalidate')
+
+    print("PASSED: test_batch_invalidate\n")
+    return (True, 'test_batch_invalidate')
+
+# Test looking up several stocks, including an invalid and a repeated one, with one request
+def test_bulk_lookup():
+    print("BEGIN: test_bulk_lookup")
+    params = {"names": f"{VALID_STOCK_OPTION_1},{VALID_STOCK_OPTION_2},{INVALID_STOCK_OPTION},{VALID_STOCK_OPTION_1}"}
+    lookupResJson = (requests.get(URL_LOOKUP, params=params)).json()
+
+    # Get state of cache after the lookup
+    cacheAfter = (requests.get(URL_CACHE)).json()
+
+    try:
+        # Assert that each valid stock was returned once, in the order requested
+        stocks = lookupResJson["data"]["stocks"]
+        assert([stock["name"] for stock in stocks] == [VALID_STOCK_OPTION_1, VALID_STOCK_OPTION_2])
+
+        # Assert that the invalid stock was reported as not found
+        assert(lookupResJson["data"]["not-found"] == [INVALID_STOCK_OPTION])
+
+        # Assert that the stocks fetched from the catalog were cached
+        cachedNames = [entry["name"] for entry in cacheAfter]
+        assert(VALID_STOCK_OPTION_1 in cachedNames)
+        assert(VALID_STOCK_OPTION_2 in cachedNames)
+    except:
+        print("Failed test_bulk_lookup")
+        print(f"Lookup response: {lookupResJson}")
+        print(f"State of cache: {cacheAfter}\n")
+        return (False, 'test_bulk_lookup')
+
+    print("PASSED: test_bulk_lookup\n")
+    return (True, 'test_bulk_lookup')
+
+# Test trading a valid stock, an invalid stock, and an invalid transaction type with one request
+def test_batch_orders():
+    print("BEGIN: test_batch_orders")
+    batchJson = {
+        "orders": [
+            {"name": VALID_STOCK_OPTION_2, "quantity": 1, "type": "sell"},
+            {"name": INVALID_STOCK_OPTION, "quantity": 1, "type": "buy"},
+            {"name": VALID_STOCK_OPTION_2, "quantity": 1, "type": "lend"}
+        ]
+    }
+    batchResJson = (requests.post(URL_ORDERS_BATCH, json=batchJson)).json()
+
+    try:
+        # Assert that one result was returned for each order, in order
+        results = batchResJson["data"]["results"]
+        assert(len(results) == 3)
+
+        # Assert that the valid order was given a transaction number that can be looked up
+        orderNum = results[0]["transaction-number"]
+        orderJson = (requests.get(f"{URL_ORDERS}/{orderNum}")).json()
+        assert(orderJson["data"]["name"] == VALID_STOCK_OPTION_2)
+
+        # Assert that the invalid stock and invalid transaction type were rejected
+        assert(results[1]["error"]["code"] == 404)
+        assert(results[2]["error"]["code"] == 500)
+    except:
+        print("Failed test_batch_orders")
+        print(f"Batch order response: {batchResJson}\n")
+        return (False, 'test_batch_orders')
+
+    print("PASSED: test_batch_orders\n")
+    return (True, 'test_batch_orders')
+
+# Test that an order can be looked up right after it is made, and matches the order that was sent
+def test_lookup_new_order():
+    print("BEGIN: test_lookup_new_order")
+    sellJson = {
+        "name": VALID_STOCK_OPTION_2,
+        "quantity": 2,
+        "type": "sell"
+    }
+    sellResJson = (requests.post(URL_ORDERS, json=sellJson)).json()
+
+    orderJson = {}
+    try:
+        # Look up the order by the transaction number it was given
+        orderNum = sellResJson["data"]["transaction-number"]
+        orderJson = (requests.get(f"{URL_ORDERS}/{orderNum}")).json()
+
+        # Assert that the order matches the one that was sent
+        orderData = orderJson["data"]
+        assert(orderData["number"] == str(orderNum))
+        assert(orderData["name"] == sellJson["name"])
+        assert(orderData["quantity"] == sellJson["quantity"])
+        assert(orderData["type"] == sellJson["type"])
+    except:
+        print("Failed test_lookup_new_order")
+        print(f"Sell response: {sellResJson}")
+        print(f"Order lookup response: {orderJson}\n")
+        return (False, 'test_lookup_new_order')
+
+    print("PASSED: test_lookup_new_order\n")
+    return (True, 'test_lookup_new_order')
+
 # Test consistency among the local databases for each order service
 def test_consistency():
     print("BEGIN: test_consistency")
@@ -464,28 +602,33 @@ def test_consistency():
     }
     print(f"{(requests.post(URL_ORDERS, json=buyJson)).json()}\n")
     
-    # Retrieve all local databases from each order service
-    databases = {}
-    for orderRepID in ORDER_SERVERS:
-        # Get the host and port for the order service
-        orderHost, orderPort = ORDER_SERVERS[orderRepID]
-
-        # Format URL to send request for database
-        url = f"http://{orderHost}:{orderPort}/dump-database"
-
-        # Add current order service's database to dictionary
-        databases[orderRepID] = (requests.get(url)).json()
+    # The leader replies before its followers have applied the push, so give them a moment to catch up
+    for attempt in range(REPLICATION_ATTEMPTS):
+        # Retrieve all local databases from each order service
+        databases = {}
+        for orderRepID in ORDER_SERVERS:
+            # Get the host and port for the order service
+            orderHost, orderPort = ORDER_SERVERS[orderRepID]
+
+            # Format URL to send request for database
+            url = f"http://{orderHost}:{orderPort}/dump-database"
+
+            # Add current order service's database to dictionary
+            databases[orderRepID] = (requests.get(url)).json()
+
+        # Stop once every database contains the same contents as the first replica's
+        firstID = min(databases)
+        mismatchedIDs = [orderRepID for orderRepID in databases if databases[orderRepID] != databases[firstID]]
+        if not mismatchedIDs:
+            break
+        time.sleep(REPLICATION_DELAY)
     
     # Assert that each database contains the same contents
-    for i in range(2):
-        id = i + 1
-        curDatabase = databases[id]
-        nextDatabase = databases[id + 1]
-
-        if curDatabase != nextDatabase:
-            print("Failed test_consistency")
-            print(f"Databases do not match:\n Order {id}: {curDatabase}\n Order {id + 1}: {nextDatabase}\n")
-            return (False, 'test_consistency')
+    if mismatchedIDs:
+        print("Failed test_consistency")
+        for orderRepID in mismatchedIDs:
+            print(f"Databases do not match:\n Order {firstID}: {databases[firstID]}\n Order {orderRepID}: {databases[orderRepID]}\n")
+        return (False, 'test_consistency')
     
     print("PASSED: test_consistency")
     print("All databases are consistent among replicas\n")
@@ -575,6 +718,10 @@ if __name__ == "__main__":
         test_trade_invalid_stock,
         test_lru_cache,
         test_invalidate,
+        test_batch_invalidate,
+        test_bulk_lookup,
+        test_batch_orders,
+        test_lookup_new_order,
         test_consistency,
         test_fault_tolerance
     ]
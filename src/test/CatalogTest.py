@@ -13,6 +13,8 @@ CATALOG_PORT = int(os.getenv('CATALOG_PORT')) # Get catalog host's port
 URL_BASE = f"http://{CATALOG_HOST}:{CATALOG_PORT}"
 URL_LOOKUP = f"{URL_BASE}/lookup"
 URL_UPDATE = f"{URL_BASE}/update"
+URL_TRADE = f"{URL_BASE}/trade"
+URL_LOOKUP_BATCH = f"{URL_BASE}/lookup-batch"
 
 # Set names of stocks to look up
 VALID_STOCK_OPTION = "GameStart"
@@ -65,6 +67,64 @@ def test_lookup_invalid_stock():
         print(f"Message received from Catalog: {resJSON}\n")
         return (False, "test+lookup_invalid_stock")
 
+# Test looking up a valid and an invalid stock in one batched request
+def test_lookup_batch():
+    # Send batched lookup request
+    params = {"names": f"{VALID_STOCK_OPTION},{INVALID_STOCK_OPTION}"}
+    lookupRes = requests.get(URL_LOOKUP_BATCH, params=params)
+    resJSON = lookupRes.json()
+
+    try:
+        # Assert that one result was returned for each stock, in order
+        results = resJSON["results"]
+        assert(len(results) == 2)
+
+        # Assert that the valid stock was found and the invalid stock was not
+        assert(results[0]["name"] == VALID_STOCK_OPTION)
+        assert(results[1]["error"]["code"] == 404)
+
+        print("Passed test_lookup_batch")
+        print(f"Message received from Catalog: {resJSON}\n")
+        return (True, "test_lookup_batch")
+    except:
+        print("Failed test_lookup_batch")
+        print(f"Message received from Catalog: {resJSON}\n")
+        return (False, "test_lookup_batch")
+
+# Test that a lookup with the stock's current ETag is answered with 304, and that a trade changes the ETag
+def test_lookup_not_modified():
+    url = f"{URL_LOOKUP}/{VALID_STOCK_OPTION}"
+
+    # Look up the stock, then look it up again with its ETag
+    etag = requests.get(url).headers.get("ETag")
+    notModifiedRes = requests.get(url, headers={"If-None-Match": etag})
+
+    # Sell a share of the stock, then look it up again with the old ETag
+    tradeJSON = {
+        "name": VALID_STOCK_OPTION,
+        "quantity": 1,
+        "type": "sell"
+    }
+    requests.post(URL_TRADE, json=tradeJSON)
+    modifiedRes = requests.get(url, headers={"If-None-Match": etag})
+
+    try:
+        # Assert that the unchanged stock was not sent again
+        assert(etag is not None)
+        assert(notModifiedRes.status_code == 304)
+
+        # Assert that the changed stock was sent with a new ETag
+        assert(modifiedRes.status_code == 200)
+        assert(modifiedRes.headers.get("ETag") != etag)
+        assert(modifiedRes.json()["name"] == VALID_STOCK_OPTION)
+
+        print("Passed test_lookup_not_modified\n")
+        return (True, "test_lookup_not_modified")
+    except:
+        print("Failed test_lookup_not_modified")
+        print(f"Status codes received from Catalog: {notModifiedRes.status_code}, {modifiedRes.status_code}\n")
+        return (False, "test_lookup_not_modified")
+
 # Test incrementing a valid stock
 def test_increment_valid_stock():
     # Format URL to send lookup request to
@@ -212,6 +272,67 @@ def test_update_invalid():
         return (False, 'test_update_invalid')
 
 
+# Test that buying more shares than are available through /trade fails and leaves the stock unchanged
+def test_trade_over_limit():
+    # Format URL to send lookup request to
+    lookupUrl = f"{URL_LOOKUP}/{VALID_STOCK_OPTION}"
+
+    # Format JSON to send with trade request
+    tradeRequestJSON = {
+        "name": VALID_STOCK_OPTION,
+        "quantity": 1000000,
+        "type": "buy"
+    }
+
+    # Send a lookup request before and after the trade
+    lookupRes1 = requests.get(lookupUrl)
+    tradeRes = requests.post(URL_TRADE, json=tradeRequestJSON)
+    lookupRes2 = requests.get(lookupUrl)
+
+    tradeJSON = tradeRes.json()
+
+    try:
+        # Assert that the trade returned a 409 error
+        assert("error" in tradeJSON)
+        assert(tradeJSON["error"]["code"] == 409)
+        assert(tradeRes.status_code == 409)
+
+        # Assert that the quantity of the stock did not change
+        assert(lookupRes1.json()["quantity"] == lookupRes2.json()["quantity"])
+
+        print("Passed test_trade_over_limit")
+        print(f"Message from Catalog: {tradeJSON}\n")
+        return (True, 'test_trade_over_limit')
+    except:
+        print("Failed test_trade_over_limit")
+        print(f"Message from Catalog: {tradeJSON}\n")
+        return (False, 'test_trade_over_limit')
+
+# Test that trading an invalid stock through /trade returns a 404 error
+def test_trade_invalid():
+    # Format JSON to send with trade request
+    tradeRequestJSON = {
+        "name": INVALID_STOCK_OPTION,
+        "quantity": 10,
+        "type": "sell"
+    }
+
+    tradeRes = requests.post(URL_TRADE, json=tradeRequestJSON)
+    tradeJSON = tradeRes.json()
+
+    try:
+        # Assert that the trade returned a 404 error
+        assert("error" in tradeJSON)
+        assert(tradeJSON["error"]["code"] == 404)
+        assert(tradeRes.status_code == 404)
+
+        print("Passed test_trade_invalid")
+        print(f"Message from Catalog: {tradeJSON}\n")
+        return (True, 'test_trade_invalid')
+    except:
+        print("Failed test_trade_invalid")
+        print(f"Message from Catalog: {tradeJSON}\n")
+        return (False, 'test_trade_invalid')
 
 
 if __name__ == "__main__":
@@ -220,9 +341,13 @@ if __name__ == "__main__":
     tests = [
         test_lookup_valid_stock,
         test_lookup_invalid_stock,
+        test_lookup_batch,
+        test_lookup_not_modified,
         test_increment_valid_stock,
         test_decrement_valid_stock,
-        test_update_invalid
+        test_update_invalid,
+        test_trade_over_limit,
+        test_trade_invalid
     ]
 
     # Run each test
@@ -0,0 +1,193 @@
+import json
+import os
+import sys
+import tempfile
+
+# The ledger is a plain class, so these tests use it directly without starting an order replica
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'orders'))
+from Ledger import Ledger
+
+# Names of the ledger's files, which are created in the current directory as on an order replica
+CHECKPOINT_FILENAME = 'order1_database.json'
+SEGMENT_PREFIX = 'order1_segment'
+
+# Create a ledger in a new temporary directory, starting from a checkpoint with the given entries
+# Segments hold at most segmentSize entries
+def create_ledger(checkpointEntries, segmentSize):
+    os.chdir(tempfile.mkdtemp())
+
+    checkpoint = {
+        "nextID": len(checkpointEntries),
+        "ledger": {}
+    }
+    for id in range(len(checkpointEntries)):
+        checkpoint["ledger"][str(id)] = checkpointEntries[id]
+    with open(CHECKPOINT_FILENAME, 'w') as outfile:
+        outfile.write(json.dumps(checkpoint))
+
+    return Ledger(CHECKPOINT_FILENAME, SEGMENT_PREFIX, segmentSize)
+
+# Create a ledger entry for a trade
+def create_entry(name, quantity, type):
+    return {
+        "name": name,
+        "quantity": quantity,
+        "type": type
+    }
+
+# Test that loading replays every segment written since the checkpoint on top of it
+def test_load_checkpoint_and_segments():
+    checkpointEntries = [create_entry("GameStart", 1, "buy"), create_entry("FishCo", 2, "sell")]
+    ledger = create_ledger(checkpointEntries, 2)
+
+    # Append enough entries to fill one segment and start another
+    ledger.append(2, create_entry("GameStart", 3, "buy"))
+    ledger.append(3, create_entry("BoarCo", 4, "sell"))
+    ledger.append(4, create_entry("FishCo", 5, "buy"))
+    ledger.sync()
+
+    # Recover the ledger from disk, as a replica does on startup
+    recovered = Ledger(CHECKPOINT_FILENAME, SEGMENT_PREFIX, 2)
+
+    try:
+        assert(recovered.dump() == ledger.dump())
+        assert(recovered.get_next_id() == 5)
+        assert(recovered.lookup(1) == checkpointEntries[1])
+        assert(recovered.lookup(4) == create_entry("FishCo", 5, "buy"))
+
+        print("Passed test_load_checkpoint_and_segments")
+        print(f"Recovered ledger: {recovered.dump()}\n")
+        return (True, 'test_load_checkpoint_and_segments')
+    except:
+        print("Failed test_load_checkpoint_and_segments")
+        print(f"Recovered ledger: {recovered.dump()}\n")
+        return (False, 'test_load_checkpoint_and_segments')
+
+# Test that loading ignores an entry torn by a crash in the middle of a write
+def test_load_torn_entry():
+    ledger = create_ledger([], 10)
+    ledger.append(0, create_entry("GameStart", 1, "buy"))
+    ledger.sync()
+
+    # Write the first half of an entry, as a crash during an append would leave it
+    with open(ledger.segmentFile, 'a') as outfile:
+        outfile.write('{"id": 1, "name": "Fish')
+
+    recovered = Ledger(CHECKPOINT_FILENAME, SEGMENT_PREFIX, 10)
+
+    try:
+        assert(recovered.get_next_id() == 1)
+        assert(recovered.lookup(0) == create_entry("GameStart", 1, "buy"))
+        assert(recovered.lookup(1) is None)
+
+        print("Passed test_load_torn_entry")
+        print(f"Recovered ledger: {recovered.dump()}\n")
+        return (True, 'test_load_torn_entry')
+    except:
+        print("Failed test_load_torn_entry")
+        print(f"Recovered ledger: {recovered.dump()}\n")
+        return (False, 'test_load_torn_entry')
+
+# Test that a batch of entries is given consecutive transaction IDs from its start ID and survives a restart
+def test_append_batch():
+    ledger = create_ledger([create_entry("GameStart", 1, "buy")], 2)
+
+    # The batch is larger than a segment, so it also rolls the segment
+    batch = [create_entry("FishCo", 2, "sell"), create_entry("BoarCo", 3, "buy"), create_entry("MenhirCo", 4, "sell")]
+    ledger.append_batch(1, batch)
+    ledger.sync()
+
+    recovered = Ledger(CHECKPOINT_FILENAME, SEGMENT_PREFIX, 2)
+
+    try:
+        assert(ledger.get_next_id() == 4)
+        for offset in range(len(batch)):
+            assert(ledger.lookup(1 + offset) == batch[offset])
+        assert(recovered.dump() == ledger.dump())
+
+        print("Passed test_append_batch")
+        print(f"Ledger after batch: {ledger.dump()}\n")
+        return (True, 'test_append_batch')
+    except:
+        print("Failed test_append_batch")
+        print(f"Ledger after batch: {ledger.dump()}\n")
+        return (False, 'test_append_batch')
+
+# Test that a checkpoint covers every entry and removes the segments it replaces
+def test_checkpoint():
+    ledger = create_ledger([], 2)
+    ledger.append_batch(0, [create_entry("GameStart", 1, "buy"), create_entry("FishCo", 2, "sell"), create_entry("BoarCo", 3, "buy")])
+    ledger.checkpoint()
+
+    recovered = Ledger(CHECKPOINT_FILENAME, SEGMENT_PREFIX, 2)
+
+    try:
+        # The segments covered by the checkpoint were removed, so every segment left on disk is empty
+        for fileName in os.listdir('.'):
+            if fileName.startswith(f"{SEGMENT_PREFIX}_"):
+                assert(os.path.getsize(fileName) == 0)
+        assert(recovered.dump() == ledger.dump())
+        assert(recovered.get_next_id() == 3)
+
+        print("Passed test_checkpoint")
+        print(f"Recovered ledger: {recovered.dump()}\n")
+        return (True, 'test_checkpoint')
+    except:
+        print("Failed test_checkpoint")
+        print(f"Recovered ledger: {recovered.dump()}\n")
+        return (False, 'test_checkpoint')
+
+# Test that a new checkpoint waits until the ledger has grown by as many entries as the last checkpoint held
+def test_checkpoint_interval():
+    checkpointEntries = [create_entry("GameStart", 1, "buy")] * 4
+    ledger = create_ledger(checkpointEntries, 1)
+
+    # Two segments are closed, but the ledger has only grown by two of the four entries in the checkpoint
+    ledger.append_batch(4, [create_entry("FishCo", 2, "sell")] * 2)
+    grownByHalf = ledger.needs_checkpoint(2)
+
+    ledger.append_batch(6, [create_entry("FishCo", 2, "sell")] * 2)
+    grownByAll = ledger.needs_checkpoint(2)
+
+    try:
+        assert(not grownByHalf)
+        assert(grownByAll)
+
+        print("Passed test_checkpoint_interval\n")
+        return (True, 'test_checkpoint_interval')
+    except:
+        print("Failed test_checkpoint_interval")
+        print(f"Checkpoint needed after 2 entries: {grownByHalf}, after 4 entries: {grownByAll}\n")
+        return (False, 'test_checkpoint_interval')
+
+
+if __name__ == "__main__":
+    # List of tests
+    # Tests will be run in the order they appear
+    tests = [
+        test_load_checkpoint_and_segments,
+        test_load_torn_entry,
+        test_append_batch,
+        test_checkpoint,
+        test_checkpoint_interval
+    ]
+
+    # Run each test
+    numPassed = 0
+    numFailed = 0
+    failedTests = []
+    for test in tests:
+        passed, testName = test()
+        if passed:
+            numPassed += 1
+        else:
+            numFailed += 1
+            failedTests.append(testName)
+
+    # Print each test failed
+    print('--------------------')
+    if numFailed > 0:
+        for failedTest in failedTests:
+            print(failedTest)
+    else:
+        print("All passed!")
@@ -13,6 +13,8 @@ ORDER_PORT = os.getenv('ORDER_1_PORT')
 URL_ORDER_BASE = f"http://{ORDER_HOST}:{ORDER_PORT}"
 URL_BUY = f"{URL_ORDER_BASE}/buy"
 URL_SELL = f"{URL_ORDER_BASE}/sell"
+URL_PUSH = f"{URL_ORDER_BASE}/push"
+URL_STATUS = f"{URL_ORDER_BASE}/status"
 
 # Initialize stocks to test
 VALID_STOCK_OPTION = "GameStart"
@@ -216,6 +218,33 @@ def test_successive_transaction_ids():
         print(f"Received Sell Message from Order Service: {sellRes}")
 
         return (False, 'test_successive_transaction_ids')
+
+# Test if a push that would leave a gap in the ledger is rejected with the replica's next transaction ID
+def test_push_gap():
+    nextID = (requests.get(URL_STATUS)).json()["nextID"]
+
+    # Push an entry a few transactions past the end of the ledger
+    pushJSON = {
+        "startID": nextID + 5,
+        "entries": [{"name": VALID_STOCK_OPTION, "quantity": 10, "type": "buy"}]
+    }
+    pushRes = requests.post(URL_PUSH, json=pushJSON)
+    resJSON = pushRes.json()
+
+    try:
+        assert(pushRes.status_code == 409)
+        assert(resJSON["nextID"] == nextID)
+
+        # The rejected entry was not written
+        assert((requests.get(URL_STATUS)).json()["nextID"] == nextID)
+
+        print("Passed test_push_gap")
+        print(f"Received Message from Order Service: {resJSON}\n")
+        return (True, 'test_push_gap')
+    except:
+        print("Failed test_push_gap")
+        print(f"Received Message from Order Service: {resJSON}\n")
+        return (False, 'test_push_gap')
         
 
 # Run each test
@@ -228,7 +257,8 @@ if __name__ == "__main__":
         test_invalid_buy,
         test_invalid_sell,
         test_buy_over_limit,
-        test_successive_transaction_ids
+        test_successive_transaction_ids,
+        test_push_gap
     ]
 
     # Run each test
@@ -0,0 +1,189 @@
+import json
+import os
+import sys
+import tempfile
+
+# The write-ahead log is a plain class, so these tests use it directly without starting the catalog
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'catalog'))
+from WriteAheadLog import WriteAheadLog
+
+# Set names of stocks in the test snapshot
+STOCK_OPTION_1 = "GameStart"
+STOCK_OPTION_2 = "FishCo"
+
+# Create a write-ahead log in a new temporary directory, starting from a snapshot of two stocks
+def create_wal():
+    directory = tempfile.mkdtemp()
+    snapshotFile = os.path.join(directory, 'catalog_database.json')
+    logFile = os.path.join(directory, 'catalog_log.jsonl')
+
+    snapshot = {
+        STOCK_OPTION_1: {"name": STOCK_OPTION_1, "price": 15.99, "quantity": 100, "version": 0},
+        STOCK_OPTION_2: {"name": STOCK_OPTION_2, "price": 12.99, "quantity": 100, "version": 0}
+    }
+    with open(snapshotFile, 'w') as outfile:
+        outfile.write(json.dumps(snapshot))
+
+    return WriteAheadLog(snapshotFile, logFile)
+
+# Test that replaying applies every logged update on top of the snapshot
+def test_replay_snapshot_and_log():
+    wal = create_wal()
+    wal.append(STOCK_OPTION_1, -10, 90, 1)
+    wal.append(STOCK_OPTION_2, 5, 105, 1)
+    wal.append(STOCK_OPTION_1, -20, 70, 2)
+    wal.sync()
+
+    # Recover the database with a new log, as the catalog does on startup
+    memoryDB = WriteAheadLog(wal.snapshotFile, wal.logFile).replay()
+
+    try:
+        assert(memoryDB[STOCK_OPTION_1]["quantity"] == 70)
+        assert(memoryDB[STOCK_OPTION_1]["version"] == 2)
+        assert(memoryDB[STOCK_OPTION_2]["quantity"] == 105)
+        assert(memoryDB[STOCK_OPTION_2]["version"] == 1)
+
+        print("Passed test_replay_snapshot_and_log")
+        print(f"Recovered database: {memoryDB}\n")
+        return (True, 'test_replay_snapshot_and_log')
+    except:
+        print("Failed test_replay_snapshot_and_log")
+        print(f"Recovered database: {memoryDB}\n")
+        return (False, 'test_replay_snapshot_and_log')
+
+# Test that a log rotated out by a compaction that never wrote its snapshot is replayed before the current log
+def test_replay_interrupted_compaction():
+    wal = create_wal()
+    wal.append(STOCK_OPTION_1, -10, 90, 1)
+
+    # Rotate the log as a compaction does, but stop before the snapshot is written
+    wal.rotate()
+    wal.append(STOCK_OPTION_1, -5, 85, 2)
+    wal.sync()
+
+    memoryDB = WriteAheadLog(wal.snapshotFile, wal.logFile).replay()
+
+    try:
+        # Both the old log and the current log were replayed, in order
+        assert(os.path.exists(wal.oldLogFile))
+        assert(memoryDB[STOCK_OPTION_1]["quantity"] == 85)
+        assert(memoryDB[STOCK_OPTION_1]["version"] == 2)
+
+        print("Passed test_replay_interrupted_compaction")
+        print(f"Recovered database: {memoryDB}\n")
+        return (True, 'test_replay_interrupted_compaction')
+    except:
+        print("Failed test_replay_interrupted_compaction")
+        print(f"Recovered database: {memoryDB}\n")
+        return (False, 'test_replay_interrupted_compaction')
+
+# Test that rotating again after a compaction that never wrote its snapshot keeps the entries in the old log
+def test_rotate_keeps_old_log():
+    wal = create_wal()
+    wal.append(STOCK_OPTION_2, 5, 105, 1)
+
+    # Rotate the log as a compaction does, but stop before the snapshot is written, leaving a torn entry at the end of the old log
+    wal.rotate()
+    with open(wal.oldLogFile, 'a') as outfile:
+        outfile.write('{"name": "FishCo", "del')
+
+    # Rotate again, as the next compaction or the catalog's startup does
+    wal.append(STOCK_OPTION_1, -10, 90, 1)
+    wal.rotate()
+    wal.sync()
+
+    memoryDB = WriteAheadLog(wal.snapshotFile, wal.logFile).replay()
+
+    try:
+        # Updates from both rotated logs are replayed
+        assert(memoryDB[STOCK_OPTION_1]["quantity"] == 90)
+        assert(memoryDB[STOCK_OPTION_2]["quantity"] == 105)
+
+        print("Passed test_rotate_keeps_old_log")
+        print(f"Recovered database: {memoryDB}\n")
+        return (True, 'test_rotate_keeps_old_log')
+    except:
+        print("Failed test_rotate_keeps_old_log")
+        print(f"Recovered database: {memoryDB}\n")
+        return (False, 'test_rotate_keeps_old_log')
+
+# Test that an entry torn by a crash in the middle of a write is ignored
+def test_replay_torn_entry():
+    wal = create_wal()
+    wal.append(STOCK_OPTION_1, -10, 90, 1)
+    wal.sync()
+
+    # Write the first half of an entry, as a crash during an append would leave it
+    with open(wal.logFile, 'a') as outfile:
+        outfile.write('{"name": "GameStart", "delta": -10, "quan')
+
+    memoryDB = WriteAheadLog(wal.snapshotFile, wal.logFile).replay()
+
+    try:
+        assert(memoryDB[STOCK_OPTION_1]["quantity"] == 90)
+        assert(memoryDB[STOCK_OPTION_1]["version"] == 1)
+
+        print("Passed test_replay_torn_entry")
+        print(f"Recovered database: {memoryDB}\n")
+        return (True, 'test_replay_torn_entry')
+    except:
+        print("Failed test_replay_torn_entry")
+        print(f"Recovered database: {memoryDB}\n")
+        return (False, 'test_replay_torn_entry')
+
+# Test that replaying entries already reflected in the snapshot leaves the database unchanged
+def test_replay_idempotent():
+    wal = create_wal()
+    wal.append(STOCK_OPTION_1, -10, 90, 1)
+    wal.append(STOCK_OPTION_2, 5, 105, 1)
+    wal.sync()
+
+    # Write a snapshot that already covers the log, without truncating the log, then recover twice
+    firstDB = WriteAheadLog(wal.snapshotFile, wal.logFile).replay()
+    wal.write_snapshot(firstDB)
+    secondDB = WriteAheadLog(wal.snapshotFile, wal.logFile).replay()
+
+    try:
+        assert(firstDB == secondDB)
+        assert(secondDB[STOCK_OPTION_1]["quantity"] == 90)
+        assert(secondDB[STOCK_OPTION_2]["quantity"] == 105)
+
+        print("Passed test_replay_idempotent")
+        print(f"Recovered database: {secondDB}\n")
+        return (True, 'test_replay_idempotent')
+    except:
+        print("Failed test_replay_idempotent")
+        print(f"Recovered databases: {firstDB} and {secondDB}\n")
+        return (False, 'test_replay_idempotent')
+
+
+if __name__ == "__main__":
+    # List of tests
+    # Tests will be run in the order they appear
+    tests = [
+        test_replay_snapshot_and_log,
+        test_replay_interrupted_compaction,
+        test_rotate_keeps_old_log,
+        test_replay_torn_entry,
+        test_replay_idempotent
+    ]
+
+    # Run each test
+    numPassed = 0
+    numFailed = 0
+    failedTests = []
+    for test in tests:
+        passed, testName = test()
+        if passed:
+            numPassed += 1
+        else:
+            numFailed += 1
+            failedTests.append(testName)
+
+    # Print each test failed
+    print('--------------------')
+    if numFailed > 0:
+        for failedTest in failedTests:
+            print(failedTest)
+    else:
+        print("All passed!")